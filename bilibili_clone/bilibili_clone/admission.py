@@ -0,0 +1,213 @@
+"""
+写请求准入控制（令牌桶）
+
+每个作用域（如 comment、reaction）有一个按用户的令牌桶和一个全局令牌桶，
+超出限制的写请求在做任何数据库写入之前直接返回 429，避免单个脚本占满
+SQLite 唯一的写连接。两个桶都有令牌时才同时各取一个，被任一个桶拒绝的
+请求不消耗另一个桶的令牌。
+
+后端：
+    local  进程内令牌桶（默认，单进程部署）
+    cache  存放在 Django 缓存中，多进程共享（读-改-写非原子，并发时为近似限流）
+"""
+import threading
+import time
+from collections import Counter, OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.views.decorators.http import require_safe
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+DEFAULT_SCOPES = {
+    # (每秒补充的令牌数, 桶容量)
+    'comment': {'user': (0.2, 5), 'global': (50, 100)},
+    'reaction': {'user': (2, 10), 'global': (200, 400)},
+}
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        """
+        补充令牌，返回 (是否有令牌, 需要等待的秒数)
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return True, 0
+        return False, (1 - self.tokens) / self.rate
+
+
+class LocalBackend:
+    """
+    进程内令牌桶，只保留最近使用的 max_keys 个桶
+    """
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._rejections = Counter()
+        self._lock = threading.Lock()
+
+    def consume(self, buckets):
+        """
+        buckets 为 {级别: (键, 速率, 容量)}；全部有令牌时各取一个，
+        返回 (拒绝的级别或 None, 需要等待的秒数)
+        """
+        now = time.monotonic()
+        with self._lock:
+            selected = {level: self._bucket(key, rate, capacity) for level, (key, rate, capacity) in buckets.items()}
+            for level, bucket in selected.items():
+                allowed, retry_after = bucket.refill(now)
+                if not allowed:
+                    return level, retry_after
+            for bucket in selected.values():
+                bucket.tokens -= 1
+            return None, 0
+
+    def _bucket(self, key, rate, capacity):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, capacity)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def record_rejection(self, scope, level):
+        with self._lock:
+            self._rejections[f'{scope}.{level}'] += 1
+
+    def rejections(self):
+        with self._lock:
+            return dict(self._rejections)
+
+
+class CacheBackend:
+    """
+    把令牌桶状态 (令牌数, 更新时间) 存放在 Django 缓存中，多进程共享
+    """
+    prefix = 'admission'
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def consume(self, buckets):
+        """
+        同 LocalBackend.consume；被拒绝时不写回缓存
+        """
+        now = time.time()
+        cache_keys = {level: f'{self.prefix}:bucket:{key}' for level, (key, _, _) in buckets.items()}
+        stored = self.cache.get_many(list(cache_keys.values()))
+        remaining = {}
+        for level, (_, rate, capacity) in buckets.items():
+            tokens, updated = stored.get(cache_keys[level], (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens < 1:
+                return level, (1 - tokens) / rate
+            remaining[level] = tokens - 1
+        for level, (_, rate, capacity) in buckets.items():
+            # 桶补满之后记录就没有意义了，让它过期
+            self.cache.set(cache_keys[level], (remaining[level], now), int(capacity / rate) + 1)
+        return None, 0
+
+    def _rejection_key(self, name):
+        return f'{self.prefix}:rejections:{name}'
+
+    def record_rejection(self, scope, level):
+        key = self._rejection_key(f'{scope}.{level}')
+        self.cache.add(key, 0, None)
+        self.cache.incr(key)
+
+    def rejections(self):
+        names = [f'{scope}.{level}' for scope in _scopes() for level in ('user', 'global')]
+        values = self.cache.get_many([self._rejection_key(name) for name in names])
+        return {name: values[self._rejection_key(name)] for name in names if self._rejection_key(name) in values}
+
+
+def _config():
+    return getattr(settings, 'ADMISSION_CONTROL', {})
+
+
+def _scopes():
+    return _config().get('SCOPES', DEFAULT_SCOPES)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                config = _config()
+                if config.get('BACKEND', 'local') == 'cache':
+                    _backend = CacheBackend(config.get('CACHE_ALIAS', 'default'))
+                else:
+                    _backend = LocalBackend(config.get('MAX_KEYS', 10000))
+    return _backend
+
+
+def admit(scope, client_id):
+    """
+    同时检查客户端自己的令牌桶和全局令牌桶，都有令牌时才各取一个；
+    返回 (是否放行, 建议的重试秒数)
+    """
+    backend = get_backend()
+    limits = _scopes()[scope]
+    rejected, retry_after = backend.consume({
+        'user': (f'{scope}:user:{client_id}', *limits['user']),
+        'global': (f'{scope}:global', *limits['global']),
+    })
+    if rejected is not None:
+        backend.record_rejection(scope, rejected)
+        return False, retry_after
+    return True, 0
+
+
+def admission_control(scope):
+    """
+    写请求准入控制装饰器：超出限制时直接返回 429
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if _config().get('ENABLED', True) and request.method not in SAFE_METHODS:
+                if request.user.is_authenticated:
+                    client_id = f'u{request.user.pk}'
+                else:
+                    client_id = f'ip{request.META.get("REMOTE_ADDR")}'
+                allowed, retry_after = admit(scope, client_id)
+                if not allowed:
+                    response = JsonResponse({'success': False, 'message': 'Too many requests'}, status=429)
+                    response['Retry-After'] = max(1, round(retry_after))
+                    return response
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@require_safe
+@staff_member_required
+def admission_stats(request):
+    """
+    被拒绝的请求数（按作用域和限制级别），供监控采集
+    """
+    return JsonResponse({
+        'success': True,
+        'backend': _config().get('BACKEND', 'local'),
+        'rejections': get_backend().rejections(),
+    })
@@ -0,0 +1,173 @@
+"""
+进程内发布/订阅
+
+SSE 等长连接视图通过 subscribe(channel) 订阅频道，每个订阅者一个 asyncio 队列；
+publish() 可以在任意线程（例如通知的后台写入线程）调用，消息通过
+call_soon_threadsafe 投递到订阅者所在的事件循环。空闲连接只是在队列上等待，
+不占用 CPU，也不访问数据库。
+
+后端：
+    local  只在当前进程内投递（默认，单进程部署）
+    redis  通过 Redis PUBLISH 广播到所有进程，每个进程一个监听线程再转交本地订阅者
+           （需要安装 redis 包）
+"""
+import asyncio
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, broker, channel, max_queue):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(max_queue)
+
+    def deliver(self, message):
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # 事件循环已关闭
+            self.broker.unsubscribe(self)
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # 客户端处理不过来时丢弃，消息里总是带着最新的未读数
+            pass
+
+    async def get(self, timeout):
+        """
+        等待下一条消息，超时返回 None
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBackend:
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        """
+        在事件循环中调用，返回 Subscription
+        """
+        subscription = Subscription(self, channel, self.max_queue)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def publish(self, channel, message):
+        self.deliver(channel, message)
+
+    def deliver(self, channel, message):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(message)
+        return len(subscribers)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._channels.values())
+
+    def has_subscribers(self, channel):
+        """
+        频道是否可能有订阅者；没有时发布方可以跳过准备消息的开销
+        """
+        with self._lock:
+            return channel in self._channels
+
+
+class RedisBackend(LocalBackend):
+    prefix = 'pubsub:'
+
+    def __init__(self, url, max_queue=100):
+        super().__init__(max_queue)
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured('PUBSUB BACKEND "redis" requires the redis package')
+        self.client = redis.Redis.from_url(url)
+        self._listener = None
+
+    def subscribe(self, channel):
+        self._ensure_listener()
+        return super().subscribe(channel)
+
+    def publish(self, channel, message):
+        self.client.publish(self.prefix + channel, json.dumps(message))
+
+    def has_subscribers(self, channel):
+        # 订阅者可能在其他进程中，无法在本地判断
+        return True
+
+    def _ensure_listener(self):
+        if self._listener is not None:
+            return
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='pubsub-redis', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(self.prefix + '*')
+                for item in pubsub.listen():
+                    channel = item['channel'].decode()[len(self.prefix):]
+                    self.deliver(channel, json.loads(item['data']))
+            except Exception:
+                logger.exception('redis pubsub listener failed, reconnecting')
+                threading.Event().wait(1)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                config = getattr(settings, 'PUBSUB', {})
+                max_queue = config.get('MAX_QUEUE', 100)
+                if config.get('BACKEND', 'local') == 'redis':
+                    _broker = RedisBackend(config['REDIS_URL'], max_queue)
+                else:
+                    _broker = LocalBackend(max_queue)
+    return _broker
+
+
+def publish(channel, message):
+    """
+    发布消息（可 JSON 序列化的对象）；失败只记录日志，不影响调用方
+    """
+    try:
+        get_broker().publish(channel, message)
+    except Exception:
+        logger.exception('publish to %s failed', channel)
@@ -66,6 +66,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'users.context_processors.notifications',
             ],
         },
     },
@@ -84,6 +85,15 @@ DATABASES = {
     }
 }
 
+# 缓存：默认是进程内的本地内存缓存，个人主页摘要、未读计数、标签ID等缓存的失效只对当前进程生效。
+# 多进程部署时必须改为共享缓存，例如：
+# {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379/1'}}
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -120,3 +130,80 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+
+# Media files (uploaded videos, images)
+
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+
+# 观看记录写缓冲：后台线程每隔 FLUSH_INTERVAL 秒或积累 MAX_PENDING 条记录时批量落库
+VIEW_BUFFER_FLUSH_INTERVAL = 5
+VIEW_BUFFER_MAX_PENDING = 1000
+
+# 视频列表每页数量（游标分页）
+VIDEO_PAGE_SIZE = 24
+
+# 每个视频预先计算的相关视频数量；列表超过 TTL 秒后在下次访问时登记后台重新计算
+RELATED_VIDEOS_COUNT = 6
+RELATED_VIDEOS_TTL = 24 * 60 * 60
+
+# 分块上传：建议的分块大小和单个文件的最大大小
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_MAX_SIZE = 4 * 1024 * 1024 * 1024
+# 完成上传的请求崩溃后，会话保持“正在完成”状态的秒数，超过后允许重新完成
+UPLOAD_FINALIZE_TIMEOUT = 10 * 60
+
+# 标签名到ID映射的缓存时间（秒）
+TAG_CACHE_TIMEOUT = 60 * 60
+
+# 评论每页数量（游标分页）
+COMMENT_PAGE_SIZE = 20
+
+# 通知异步分发：后台线程每隔 FLUSH_INTERVAL 秒或积累 MAX_PENDING 条时批量写入；
+# DEDUPE_WINDOW 秒内相同的未读通知只保留一条
+NOTIFICATION_FLUSH_INTERVAL = 2
+NOTIFICATION_MAX_PENDING = 500
+NOTIFICATION_DEDUPE_WINDOW = 60 * 60
+# 点赞、评论等聚合通知：AGGREGATE_WINDOW 秒内同一目标的未读通知合并为一条
+NOTIFICATION_AGGREGATE_WINDOW = 24 * 60 * 60
+# 通知每页数量（游标分页）；已读通知保留的天数，超过后由 archive_notifications 归档
+NOTIFICATION_PAGE_SIZE = 20
+NOTIFICATION_RETENTION_DAYS = 90
+# 未读通知计数缓存的过期时间（秒），过期后从数据库重新统计
+NOTIFICATION_UNREAD_TTL = 5 * 60
+# 通知推送（SSE）需要以 ASGI 方式部署：WSGI 下事件流永远不会结束，每个连接会一直占用一个工作线程。
+# 以 ASGI 部署时改为 True；关闭时页面每隔 POLL_INTERVAL 秒查询一次未读数（带 ETag）
+NOTIFICATION_STREAM_ENABLED = False
+NOTIFICATION_POLL_INTERVAL = 30
+# 通知推送（SSE）连接空闲时发送心跳的间隔（秒）
+NOTIFICATION_STREAM_HEARTBEAT = 15
+
+# 进程内发布/订阅，多进程部署时把 BACKEND 改为 'redis'（需要安装 redis 包）
+PUBSUB = {
+    'BACKEND': 'local',
+    'REDIS_URL': 'redis://localhost:6379/0',
+    'MAX_QUEUE': 100,
+}
+
+# 写请求准入控制：每个作用域一个按用户和一个全局的令牌桶，(每秒补充令牌数, 桶容量)
+# 多进程部署时把 BACKEND 改为 'cache'，令牌桶存放在 CACHE_ALIAS 指定的共享缓存中
+ADMISSION_CONTROL = {
+    'ENABLED': True,
+    'BACKEND': 'local',
+    'CACHE_ALIAS': 'default',
+    'SCOPES': {
+        'comment': {'user': (0.2, 5), 'global': (50, 100)},
+        'reaction': {'user': (2, 10), 'global': (200, 400)},
+    },
+}
+
+# 关注动态：粉丝数低于 FANOUT_THRESHOLD 的UP主发布视频时由 run_media_worker 写入关注者收件箱
+# （每批 FANOUT_BATCH_SIZE 条），达到阈值的UP主在读取时合并；关注后、或UP主粉丝数回落到阈值以下时，
+# 补齐该UP主最近 BACKFILL_LIMIT 个视频
+FEED_FANOUT_THRESHOLD = 10000
+FEED_FANOUT_BATCH_SIZE = 1000
+FEED_BACKFILL_LIMIT = 50
+
+# 个人主页摘要缓存的过期时间（秒），相关数据变化时会立即失效（多进程部署需要共享的 CACHES）
+PROFILE_CACHE_TIMEOUT = 5 * 60
@@ -18,6 +18,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.views.generic import TemplateView
 from django.contrib.auth import views as auth_views
+from .admission import admission_stats
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -33,4 +34,5 @@ urlpatterns = [
     path('videos/', include('videos.urls')),
     path('comments/', include('comments.urls')),
     path('users/', include('users.urls')),
+    path('monitoring/admission/', admission_stats, name='admission_stats'),
 ]
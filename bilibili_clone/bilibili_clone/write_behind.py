@@ -0,0 +1,114 @@
+"""
+进程内写缓冲（write-behind）
+
+请求线程只把记录放进内存缓冲区（按 key 去重），由后台线程定期或在缓冲区
+达到上限时批量落库，页面渲染不再等待数据库写入。
+"""
+import atexit
+import logging
+import threading
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """
+    按 key 去重的写缓冲区
+
+    子类实现 write(entries)，在后台线程中批量写入数据库。
+    写入失败时记录会放回缓冲区，等待下一次刷新重试；因此 write 需要先丢弃
+    永远无法写入的记录（例如引用的行已被删除），否则整批记录会反复失败。
+    """
+    name = 'write-behind'
+
+    def __init__(self, flush_interval=5.0, max_pending=1000):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker = None
+
+    def add(self, key, entry):
+        """
+        加入一条记录，已在缓冲区中的 key 会被忽略
+        """
+        with self._lock:
+            self._pending.setdefault(key, entry)
+            size = len(self._pending)
+        self._ensure_worker()
+        if size >= self.max_pending:
+            self._wakeup.set()
+
+    def discard(self, key):
+        """
+        移除尚未写入的记录，返回是否存在
+        """
+        with self._lock:
+            return self._pending.pop(key, None) is not None
+
+    def drain(self):
+        """
+        取出并清空缓冲区中的全部记录
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def flush(self):
+        """
+        立即把缓冲区写入数据库，返回写入的记录数
+        """
+        pending = self.drain()
+        if not pending:
+            return 0
+        try:
+            return self.write(list(pending.values()))
+        except Exception:
+            # 放回缓冲区，新到达的同 key 记录优先
+            with self._lock:
+                for key, entry in pending.items():
+                    self._pending.setdefault(key, entry)
+            raise
+
+    def write(self, entries):
+        raise NotImplementedError
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._worker.start()
+                atexit.register(self._flush_at_exit)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('%s flush failed', self.name)
+            finally:
+                # 后台线程持有独立的数据库连接，每轮结束后释放
+                connections.close_all()
+
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('%s flush at exit failed', self.name)
+
+
+def existing_ids(model, ids):
+    """
+    返回 ids 中仍存在于数据库的主键（一次查询）
+    """
+    ids = {pk for pk in ids if pk is not None}
+    if not ids:
+        return set()
+    return set(model.objects.filter(pk__in=ids).values_list('pk', flat=True))
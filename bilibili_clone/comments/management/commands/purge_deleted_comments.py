@@ -0,0 +1,93 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from comments.models import Comment, CommentReaction
+
+
+class Command(BaseCommand):
+    help = '分批物理删除超过保留期的已删除评论；仍有回复引用的评论保留为空内容的占位记录，评论区中显示为“该评论已删除”'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='删除后保留的天数')
+        parser.add_argument('--batch-size', type=int, default=500, help='每个事务处理的评论数')
+        parser.add_argument('--sleep', type=float, default=0.1, help='批次之间暂停的秒数，让出数据库写锁')
+        parser.add_argument('--dry-run', action='store_true', help='只统计，不修改')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        batch_size = options['batch_size']
+        purged = tombstoned = scanned = 0
+        started = time.monotonic()
+        last_id = None
+        # 试运行时不真正删除，记下“已删除”的ID，让父评论按删除后的状态判断
+        simulated = set()
+
+        while True:
+            # 按ID倒序处理：回复的ID比父评论大，先删除的回复不会再阻止父评论被删除
+            with transaction.atomic():
+                candidates = Comment.objects.filter(is_deleted=True, deleted_at__lt=cutoff)
+                if not options['dry_run']:
+                    # 已经是占位记录且仍有回复的评论不会变化，跳过
+                    candidates = candidates.filter(
+                        ~Q(content='') | ~Exists(Comment.objects.filter(parent=OuterRef('pk')))
+                    )
+                if last_id is not None:
+                    candidates = candidates.filter(pk__lt=last_id)
+                ids = list(candidates.order_by('-pk').values_list('pk', flat=True)[:batch_size])
+                if not ids:
+                    break
+                keep_ids = self.referenced_ids(ids, simulated)
+                purge_ids = [pk for pk in ids if pk not in keep_ids]
+                # 已经是占位记录的不重复计数
+                new_tombstones = Comment.objects.filter(pk__in=keep_ids).exclude(content='')
+                if options['dry_run']:
+                    simulated.update(purge_ids)
+                    new_tombstone_count = new_tombstones.count()
+                else:
+                    CommentReaction.objects.filter(comment_id__in=ids).delete()
+                    Comment.objects.filter(pk__in=purge_ids).delete()
+                    # 占位记录：清空内容和计数，回复仍可挂在它下面
+                    new_tombstone_count = new_tombstones.update(content='', likes=0, dislikes=0, hot_score=0)
+
+            scanned += len(ids)
+            purged += len(purge_ids)
+            tombstoned += new_tombstone_count
+            last_id = ids[-1]
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'已扫描 {scanned} 条，删除 {purged} 条，保留占位 {tombstoned} 条'
+                f'（{scanned / elapsed if elapsed else 0:.0f} 条/秒）'
+            )
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        elapsed = time.monotonic() - started
+        action = '可删除' if options['dry_run'] else '已删除'
+        self.stdout.write(self.style.SUCCESS(
+            f'清理完成：{action} {purged} 条评论，保留占位 {tombstoned} 条，'
+            f'耗时 {elapsed:.1f} 秒（{scanned / elapsed if elapsed else 0:.0f} 条/秒）'
+        ))
+
+    def referenced_ids(self, ids, gone=()):
+        """
+        本批中仍被其他评论（未删除的回复、未到期或不在本批的已删除回复）引用的评论ID
+
+        被保留的评论又会让它的父评论保留，直到不再变化。gone 中的回复视为已删除。
+        """
+        id_set = set(ids)
+        children = Comment.objects.filter(parent_id__in=ids).values_list('pk', 'parent_id')
+        child_parents = {pk: parent_id for pk, parent_id in children if pk not in gone}
+        keep = {parent_id for pk, parent_id in child_parents.items() if pk not in id_set}
+        changed = True
+        while changed:
+            changed = False
+            for pk, parent_id in child_parents.items():
+                if pk in keep and parent_id not in keep:
+                    keep.add(parent_id)
+                    changed = True
+        return keep
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from comments.models import Comment, CommentReaction, hot_score
+
+
+def _reaction_count(reaction_type):
+    return Coalesce(Subquery(
+        CommentReaction.objects.filter(comment=OuterRef('pk'), reaction_type=reaction_type)
+        .order_by().values('comment').annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = '根据 CommentReaction 分批校验并修正评论的 likes/dislikes 计数（同时更新热度）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批处理的评论数')
+        parser.add_argument('--dry-run', action='store_true', help='只报告不一致的评论，不修改')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        total = 0
+        mismatched = 0
+        while True:
+            rows = list(
+                Comment.objects.filter(pk__gt=last_id).order_by('pk').annotate(
+                    likes_total=Count('comment_reactions', filter=Q(comment_reactions__reaction_type='like')),
+                    dislikes_total=Count('comment_reactions', filter=Q(comment_reactions__reaction_type='dislike')),
+                ).values_list('pk', 'likes', 'dislikes', 'likes_total', 'dislikes_total')[:batch_size]
+            )
+            if not rows:
+                break
+            stale_ids = [
+                pk for pk, likes, dislikes, likes_total, dislikes_total in rows
+                if (likes, dislikes) != (likes_total, dislikes_total)
+            ]
+            if stale_ids and not options['dry_run']:
+                # 用子查询在同一条 UPDATE 中重新计数，避免覆盖期间发生的点赞
+                Comment.objects.filter(pk__in=stale_ids).update(
+                    likes=_reaction_count('like'),
+                    dislikes=_reaction_count('dislike'),
+                )
+                # 计数变化后热度也要重新计算
+                for pk, likes, dislikes, created_at in Comment.objects.filter(
+                    pk__in=stale_ids
+                ).values_list('pk', 'likes', 'dislikes', 'created_at'):
+                    Comment.objects.filter(pk=pk).update(hot_score=hot_score(likes, dislikes, created_at))
+            total += len(rows)
+            mismatched += len(stale_ids)
+            last_id = rows[-1][0]
+            self.stdout.write(f'已检查 {total} 条评论，不一致 {mismatched} 条')
+        action = '发现' if options['dry_run'] else '已修正'
+        self.stdout.write(self.style.SUCCESS(f'检查完成，共 {total} 条评论，{action} {mismatched} 条不一致'))
@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-18 12:00
+
+from django.db import migrations
+from django.db.models import Count, Q
+
+
+def backfill_comment_reaction_counts(apps, schema_editor):
+    """
+    用 CommentReaction 重新计算 likes/dislikes
+    """
+    Comment = apps.get_model('comments', 'Comment')
+    counts = Comment.objects.annotate(
+        likes_total=Count('comment_reactions', filter=Q(comment_reactions__reaction_type='like')),
+        dislikes_total=Count('comment_reactions', filter=Q(comment_reactions__reaction_type='dislike')),
+    ).exclude(likes=0, dislikes=0, likes_total=0, dislikes_total=0).values_list('pk', 'likes_total', 'dislikes_total')
+    for pk, likes_total, dislikes_total in counts.iterator():
+        Comment.objects.filter(pk=pk).update(likes=likes_total, dislikes=dislikes_total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0002_comment_is_deleted_comment_is_edited_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_comment_reaction_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 6.0 on 2026-10-18 12:00
+
+import math
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import migrations, models
+
+HOT_SCORE_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+HOT_SCORE_DECAY = 45000
+
+
+def backfill_hot_score(apps, schema_editor):
+    """
+    按点赞/点踩和发布时间计算已有评论的热度
+    """
+    Comment = apps.get_model('comments', 'Comment')
+    for pk, likes, dislikes, created_at in Comment.objects.values_list(
+        'pk', 'likes', 'dislikes', 'created_at'
+    ).iterator():
+        score = math.log10(max(likes - dislikes, 1)) + (created_at - HOT_SCORE_EPOCH).total_seconds() / HOT_SCORE_DECAY
+        Comment.objects.filter(pk=pk).update(hot_score=score)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0003_backfill_comment_reaction_counts'),
+        ('videos', '0010_unique_video_tag_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='hot_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(backfill_hot_score, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['video', 'parent', '-hot_score', '-id'], name='comment_hot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['video', 'parent', '-created_at', '-id'], name='comment_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['parent', 'created_at', 'id'], name='comment_reply_idx'),
+        ),
+    ]
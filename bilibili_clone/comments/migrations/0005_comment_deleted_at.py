@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-18 12:00
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_deleted_at(apps, schema_editor):
+    """
+    已删除评论的删除时间取最后更新时间
+    """
+    Comment = apps.get_model('comments', 'Comment')
+    Comment.objects.filter(is_deleted=True, deleted_at__isnull=True).update(deleted_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0004_comment_hot_score'),
+        ('videos', '0010_unique_video_tag_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_deleted_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('is_deleted', True)), fields=['deleted_at'], name='comment_deleted_idx'),
+        ),
+    ]
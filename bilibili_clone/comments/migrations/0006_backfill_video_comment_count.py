@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 12:00
+
+from django.db import migrations
+from django.db.models import Count, Q
+
+
+def backfill_video_comment_count(apps, schema_editor):
+    """
+    用未删除的评论（含回复）重新计算 Video.comment_count
+    """
+    Video = apps.get_model('videos', 'Video')
+    counts = Video.objects.annotate(
+        comments_total=Count('comments', filter=Q(comments__is_deleted=False)),
+    ).values_list('pk', 'comments_total')
+    for pk, comments_total in counts.iterator():
+        Video.objects.filter(pk=pk).update(comment_count=comments_total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0005_comment_deleted_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_video_comment_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-18 12:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+def backfill_root(apps, schema_editor):
+    """
+    逐层填写回复所在楼层：先填直接回复顶层评论的，再沿 parent 向下传递
+    """
+    Comment = apps.get_model('comments', 'Comment')
+    Comment.objects.filter(parent__isnull=False, parent__parent__isnull=True).update(root=F('parent'))
+    parent_root = Comment.objects.filter(pk=OuterRef('parent')).values('root')[:1]
+    while Comment.objects.filter(
+        parent__isnull=False, root__isnull=True, parent__root__isnull=False,
+    ).update(root=Subquery(parent_root)):
+        pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0006_backfill_video_comment_count'),
+        ('videos', '0011_feed_entry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='root',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='thread_replies', to='comments.comment'),
+        ),
+        migrations.RunPython(backfill_root, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['root', 'created_at', 'id'], name='comment_thread_idx'),
+        ),
+    ]
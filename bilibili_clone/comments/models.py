@@ -1,33 +1,146 @@
-from django.db import models
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Log
 from django.contrib.auth.models import User
+from django.utils import timezone
 from videos.models import Video
 
+# 热度 = log10(max(点赞 - 点踩, 1)) + 发布时间 / HOT_SCORE_DECAY
+# 新评论每晚 HOT_SCORE_DECAY 秒发布，需要多10倍的净点赞才能排在同一位置
+HOT_SCORE_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+HOT_SCORE_DECAY = 45000
+
+
+def hot_score(likes, dislikes, created_at):
+    return math.log10(max(likes - dislikes, 1)) + _recency(created_at)
+
+
+def _recency(created_at):
+    return (created_at - HOT_SCORE_EPOCH).total_seconds() / HOT_SCORE_DECAY
+
 
 class Comment(models.Model):
     video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     content = models.TextField()
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
-    created_at = models.DateTimeField(auto_now_add=True)
+    # 所在楼层的顶层评论，回复的回复也归入同一楼层；顶层评论为空
+    root = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='thread_replies')
+    # 不用 auto_now_add：创建实例时确定时间，热度和保存的创建时间一致
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
     likes = models.PositiveIntegerField(default=0)
     dislikes = models.PositiveIntegerField(default=0)
     is_edited = models.BooleanField(default=False)  # 是否被编辑过
     is_deleted = models.BooleanField(default=False)  # 是否被删除
+    deleted_at = models.DateTimeField(null=True, blank=True)  # 删除时间，用于定期清理
+    hot_score = models.FloatField(default=0)  # 热度，随点赞/点踩更新
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['video', 'parent', '-hot_score', '-id'], name='comment_hot_idx'),
+            models.Index(fields=['video', 'parent', '-created_at', '-id'], name='comment_newest_idx'),
+            models.Index(fields=['parent', 'created_at', 'id'], name='comment_reply_idx'),
+            models.Index(fields=['root', 'created_at', 'id'], name='comment_thread_idx'),
+            models.Index(fields=['deleted_at'], name='comment_deleted_idx', condition=models.Q(is_deleted=True)),
+        ]
     
     def __str__(self):
         return f'Comment by {self.author.username} on {self.video.title}'
     
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if adding and self.parent_id is not None and self.root_id is None:
+            self.root_id = self.parent.root_id or self.parent_id
+        if adding:
+            self.hot_score = hot_score(self.likes, self.dislikes, self.created_at)
+        if not adding or self.is_deleted:
+            super().save(*args, **kwargs)
+            return
+        # 新评论与视频的评论数在同一事务中更新
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Video.objects.filter(pk=self.video_id).update(comment_count=F('comment_count') + 1)
+    
+    def soft_delete(self):
+        """
+        软删除评论并减少视频的评论数；已删除时不做任何事，返回是否删除
+        """
+        return self._set_deleted(True)
+    
+    def restore(self):
+        """
+        恢复已软删除的评论并增加视频的评论数，返回是否恢复
+        """
+        return self._set_deleted(False)
+    
+    def _set_deleted(self, deleted):
+        now = timezone.now()
+        with transaction.atomic():
+            # 条件更新，并发的重复删除/恢复只有一次生效
+            changed = Comment.objects.filter(pk=self.pk, is_deleted=not deleted).update(
+                is_deleted=deleted, deleted_at=now if deleted else None, updated_at=now
+            )
+            if changed:
+                Video.objects.filter(pk=self.video_id).update(
+                    comment_count=F('comment_count') + (-1 if deleted else 1)
+                )
+        if changed:
+            self.is_deleted = deleted
+            self.deleted_at = now if deleted else None
+            self.updated_at = now
+        return bool(changed)
+    
     @property
     def total_likes(self):
-        return self.comment_reactions.filter(reaction_type='like').count()
+        return self.likes
     
     @property
     def total_dislikes(self):
-        return self.comment_reactions.filter(reaction_type='dislike').count()
+        return self.dislikes
+    
+    def toggle_reaction(self, user, reaction_type):
+        """
+        切换用户对评论的点赞/点踩，并在同一事务中更新 likes/dislikes/hot_score
+
+        返回 (原有反应类型, 当前反应类型)，没有反应时为 None
+        """
+        with transaction.atomic():
+            existing_reaction = CommentReaction.objects.filter(comment=self, user=user).first()
+            previous = existing_reaction.reaction_type if existing_reaction else None
+            
+            if existing_reaction is None:
+                CommentReaction.objects.create(comment=self, user=user, reaction_type=reaction_type)
+                current = reaction_type
+            elif previous == reaction_type:
+                # 相同的反应类型，则取消
+                existing_reaction.delete()
+                current = None
+            else:
+                # 不同的反应类型，则更新
+                existing_reaction.reaction_type = reaction_type
+                existing_reaction.save(update_fields=['reaction_type'])
+                current = reaction_type
+            
+            like_delta = (current == 'like') - (previous == 'like')
+            dislike_delta = (current == 'dislike') - (previous == 'dislike')
+            # SET 中的 F() 读取的是更新前的值
+            net_likes = F('likes') + like_delta - F('dislikes') - dislike_delta
+            Comment.objects.filter(pk=self.pk).update(
+                likes=F('likes') + like_delta,
+                dislikes=F('dislikes') + dislike_delta,
+                hot_score=Log(10, Greatest(net_likes, 1)) + Value(_recency(self.created_at)),
+            )
+        
+        # 同步内存中的计数，调用方无需再查询
+        self.likes += like_delta
+        self.dislikes += dislike_delta
+        self.hot_score = hot_score(self.likes, self.dislikes, self.created_at)
+        return previous, current
 
 
 class CommentReaction(models.Model):
@@ -0,0 +1,114 @@
+"""
+视频评论的分页加载
+
+顶层评论按热度或时间游标分页；每页的回复预览用窗口函数一次取出
+（每个楼层最多 REPLY_PREVIEW 条），其余回复按需通过接口加载。
+楼层按 Comment.root 归组，回复的回复也显示在所在楼层中（parent_id 指明回复对象）。
+已删除的评论不显示，但仍有未删除回复的（包括清理任务留下的空内容占位记录）
+显示为“该评论已删除”的占位，它下面的回复照常显示。
+首屏查询数和数据量与视频的评论总数无关。
+"""
+from django.db.models import Count, Exists, F, OuterRef, Q, Window
+from django.db.models.functions import RowNumber
+
+from videos.pagination import paginate
+
+from .models import Comment
+
+COMMENT_ORDERINGS = {
+    'hot': ('-hot_score', '-id'),
+    'newest': ('-created_at', '-id'),
+}
+REPLY_ORDERING = ('created_at', 'id')
+
+# 每个楼层预先加载的回复数
+REPLY_PREVIEW = 3
+
+
+def load_comment_page(video, sort='hot', cursor=None, page_size=20):
+    """
+    返回 (顶层评论列表, 下一页游标)
+
+    每条评论带有 reply_list（前几条回复，可能包括占位）、reply_count（未删除的回复数，
+    与 Video.comment_count 的口径一致）和 has_more_replies（是否还有未预加载的回复）。
+    """
+    comments, next_cursor = paginate(
+        _visible(Comment.objects.filter(video=video, parent=None), 'root').select_related('author'),
+        cursor,
+        page_size,
+        COMMENT_ORDERINGS[sort],
+    )
+    attach_reply_previews(comments)
+    return comments, next_cursor
+
+
+def attach_reply_previews(comments, limit=REPLY_PREVIEW):
+    """
+    一次查询为每条评论取出前 limit 条回复及回复总数
+    """
+    for comment in comments:
+        comment.reply_list = []
+        comment.reply_count = 0
+        comment.has_more_replies = False
+    if not comments:
+        return
+
+    by_id = {comment.id: comment for comment in comments}
+    replies = _thread_replies(Comment.objects.filter(root__in=list(by_id))).annotate(
+        position=Window(RowNumber(), partition_by=F('root'), order_by=[F(field) for field in REPLY_ORDERING]),
+        thread_rows=Window(Count('id'), partition_by=F('root')),
+        # 占位不计入回复数
+        thread_total=Window(Count('id', filter=Q(is_deleted=False)), partition_by=F('root')),
+    ).filter(position__lte=limit).order_by('root', 'position')
+    for reply in replies:
+        root = by_id[reply.root_id]
+        root.reply_list.append(reply)
+        root.reply_count = reply.thread_total
+        root.has_more_replies = reply.thread_rows > limit
+
+
+def load_replies(comment, cursor=None, page_size=20):
+    """
+    返回 (楼层中的回复列表, 下一页游标)，包括回复的回复
+    """
+    return paginate(
+        _thread_replies(Comment.objects.filter(root=comment)),
+        cursor,
+        page_size,
+        REPLY_ORDERING,
+    )
+
+
+def _thread_replies(queryset):
+    return _visible(queryset, 'parent').select_related('author')
+
+
+def _visible(queryset, link):
+    """
+    未删除的评论，以及通过 link（root 或 parent）仍有未删除回复的已删除评论
+    """
+    return queryset.filter(
+        Q(is_deleted=False) | Exists(Comment.objects.filter(**{link: OuterRef('pk')}, is_deleted=False))
+    )
+
+
+def comment_to_dict(comment):
+    data = {
+        'id': comment.id,
+        'parent_id': comment.parent_id,
+        'author': comment.author.username,
+        'content': comment.content,
+        'created_at': comment.created_at.isoformat(),
+        'likes': comment.likes,
+        'dislikes': comment.dislikes,
+        'is_edited': comment.is_edited,
+        'is_deleted': comment.is_deleted,
+    }
+    if comment.is_deleted:
+        # 占位只保留位置，不返回作者和内容
+        data.update(author=None, content='', likes=0, dislikes=0)
+    if hasattr(comment, 'reply_list'):
+        data['replies'] = [comment_to_dict(reply) for reply in comment.reply_list]
+        data['reply_count'] = comment.reply_count
+        data['has_more_replies'] = comment.has_more_replies
+    return data
@@ -8,4 +8,9 @@ urlpatterns = [
     path('<int:comment_id>/reply/', views.reply_comment, name='reply_comment'),
     path('<int:comment_id>/like/', views.like_comment, name='like_comment'),
     path('<int:comment_id>/dislike/', views.dislike_comment, name='dislike_comment'),
+    path('<int:comment_id>/delete/', views.delete_comment, name='delete_comment'),
+    path('<int:comment_id>/restore/', views.restore_comment, name='restore_comment'),
+    path('<int:comment_id>/toggle-reaction/', views.toggle_comment_reaction, name='toggle_comment_reaction'),
+    path('api/video/<int:video_id>/', views.video_comments_api, name='video_comments_api'),
+    path('api/<int:comment_id>/replies/', views.comment_replies_api, name='comment_replies_api'),
 ]
\ No newline at end of file
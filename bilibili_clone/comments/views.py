@@ -1,12 +1,28 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.contrib.auth.models import User
+from django.utils import timezone
+from django.views.decorators.http import require_POST, require_safe
+from bilibili_clone.admission import admission_control
 from videos.models import Video
-from users.models import Notification
-from .models import Comment, CommentReaction
+from videos.pagination import InvalidCursor
+from users.notifier import notifier
+from .models import Comment
+from .tree import COMMENT_ORDERINGS, comment_to_dict, load_comment_page, load_replies
 
 
+def _page_size(request):
+    default = getattr(settings, 'COMMENT_PAGE_SIZE', 20)
+    try:
+        return max(1, min(int(request.GET.get('page_size', default)), 100))
+    except ValueError:
+        return default
+
+
+@login_required
+@admission_control('comment')
 def add_comment(request, video_id):
     """
     添加评论的视图函数
@@ -15,7 +31,7 @@ def add_comment(request, video_id):
         video = get_object_or_404(Video, id=video_id)
         content = request.POST.get('content')
         
-        if content and request.user.is_authenticated:
+        if content:
             parent_id = request.POST.get('parent_id')
             parent = None
             
@@ -33,25 +49,29 @@ def add_comment(request, video_id):
             )
             
             # 如果不是回复评论，则通知视频上传者
-            if not parent and video.uploader != request.user:
-                Notification.objects.create(
-                    recipient=video.uploader,
-                    sender=request.user,
+            if not parent and video.uploader_id != request.user.id:
+                notifier.notify(
+                    recipient_id=video.uploader_id,
+                    sender_id=request.user.id,
                     notification_type='comment',
                     title=f'{request.user.username} 评论了你的视频',
                     message=f'{request.user.username} 在你的视频 "{video.title}" 下发表了评论：{content[:50]}...',
-                    target_url=f'{video.get_absolute_url()}#comment-{comment.id}'
+                    target_url=f'{video.get_absolute_url()}#comment-{comment.id}',
+                    aggregate_key=f'comment:video:{video.id}',
+                    verb='评论了你的视频',
                 )
             
             # 如果是回复评论，通知被回复的用户（如果不是自己）
-            if parent and parent.author != request.user:
-                Notification.objects.create(
-                    recipient=parent.author,
-                    sender=request.user,
+            if parent and parent.author_id != request.user.id:
+                notifier.notify(
+                    recipient_id=parent.author_id,
+                    sender_id=request.user.id,
                     notification_type='comment',
                     title=f'{request.user.username} 回复了你的评论',
                     message=f'{request.user.username} 在视频 "{video.title}" 下回复了你的评论：{content[:50]}...',
-                    target_url=f'{video.get_absolute_url()}#comment-{comment.id}'
+                    target_url=f'{video.get_absolute_url()}#comment-{comment.id}',
+                    aggregate_key=f'reply:comment:{parent.id}',
+                    verb='回复了你的评论',
                 )
             
             return JsonResponse({
@@ -62,19 +82,20 @@ def add_comment(request, video_id):
         else:
             return JsonResponse({
                 'success': False,
-                'message': 'Please log in and provide content'
+                'message': 'Please provide content'
             })
     
     return redirect('video_detail', pk=video_id)
 
 
 @login_required
+@admission_control('comment')
 def reply_comment(request, comment_id):
     """
     回复评论的视图函数
     """
     if request.method == 'POST':
-        parent_comment = get_object_or_404(Comment, id=comment_id)
+        parent_comment = get_object_or_404(Comment.objects.select_related('video'), id=comment_id)
         content = request.POST.get('content')
         
         if content and request.user.is_authenticated:
@@ -86,14 +107,16 @@ def reply_comment(request, comment_id):
             )
             
             # 通知被回复的用户（如果不是自己）
-            if parent_comment.author != request.user:
-                Notification.objects.create(
-                    recipient=parent_comment.author,
-                    sender=request.user,
+            if parent_comment.author_id != request.user.id:
+                notifier.notify(
+                    recipient_id=parent_comment.author_id,
+                    sender_id=request.user.id,
                     notification_type='comment',
                     title=f'{request.user.username} 回复了你的评论',
                     message=f'{request.user.username} 在视频 "{parent_comment.video.title}" 下回复了你的评论：{content[:50]}...',
-                    target_url=f'{parent_comment.video.get_absolute_url()}#comment-{reply.id}'
+                    target_url=f'{parent_comment.video.get_absolute_url()}#comment-{reply.id}',
+                    aggregate_key=f'reply:comment:{parent_comment.id}',
+                    verb='回复了你的评论',
                 )
             
             return JsonResponse({
@@ -111,113 +134,102 @@ def reply_comment(request, comment_id):
 
 
 @login_required
+@admission_control('reaction')
 def like_comment(request, comment_id):
     """
     点赞评论的视图函数
     """
     if request.method == 'POST':
-        comment = get_object_or_404(Comment, id=comment_id)
-        
-        # 检查是否存在已有反应
-        existing_reaction = CommentReaction.objects.filter(
-            comment=comment,
-            user=request.user
-        ).first()
+        comment = get_object_or_404(Comment.objects.select_related('video'), id=comment_id)
+        previous, current = comment.toggle_reaction(request.user, 'like')
         
-        if existing_reaction:
-            if existing_reaction.reaction_type == 'like':
-                # 如果已经是点赞，则取消
-                existing_reaction.delete()
-            else:
-                # 如果是点踩，则改为点赞
-                existing_reaction.reaction_type = 'like'
-                existing_reaction.save()
-        else:
-            # 创建新的点赞
-            CommentReaction.objects.create(
-                comment=comment,
-                user=request.user,
-                reaction_type='like'
+        # 新的点赞，通知评论作者（如果不是自己）
+        if previous is None and current == 'like' and comment.author_id != request.user.id:
+            notifier.notify(
+                recipient_id=comment.author_id,
+                sender_id=request.user.id,
+                notification_type='like',
+                title=f'{request.user.username} 点赞了你的评论',
+                message=f'{request.user.username} 点赞了你在视频 "{comment.video.title}" 下的评论',
+                target_url=f'{comment.video.get_absolute_url()}#comment-{comment.id}',
+                aggregate_key=f'like:comment:{comment.id}',
+                verb='点赞了你的评论',
             )
-            
-            # 通知评论作者（如果不是自己）
-            if comment.author != request.user:
-                Notification.objects.create(
-                    recipient=comment.author,
-                    sender=request.user,
-                    notification_type='like',
-                    title=f'{request.user.username} 点赞了你的评论',
-                    message=f'{request.user.username} 点赞了你在视频 "{comment.video.title}" 下的评论',
-                    target_url=f'{comment.video.get_absolute_url()}#comment-{comment.id}'
-                )
         
         # 返回更新后的统计信息
         return JsonResponse({
             'success': True,
-            'likes': comment.total_likes,
-            'dislikes': comment.total_dislikes
+            'likes': comment.likes,
+            'dislikes': comment.dislikes
         })
     
     return JsonResponse({'success': False, 'message': 'Invalid request'})
 
 
 @login_required
+@admission_control('reaction')
 def dislike_comment(request, comment_id):
     """
     点踩评论的视图函数
     """
     if request.method == 'POST':
         comment = get_object_or_404(Comment, id=comment_id)
-        
-        # 检查是否存在已有反应
-        existing_reaction = CommentReaction.objects.filter(
-            comment=comment,
-            user=request.user
-        ).first()
-        
-        if existing_reaction:
-            if existing_reaction.reaction_type == 'dislike':
-                # 如果已经是点踩，则取消
-                existing_reaction.delete()
-            else:
-                # 如果是点赞，则改为点踩
-                existing_reaction.reaction_type = 'dislike'
-                existing_reaction.save()
-        else:
-            # 创建新的点踩
-            CommentReaction.objects.create(
-                comment=comment,
-                user=request.user,
-                reaction_type='dislike'
-            )
+        comment.toggle_reaction(request.user, 'dislike')
         
         # 返回更新后的统计信息
         return JsonResponse({
             'success': True,
-            'likes': comment.total_likes,
-            'dislikes': comment.total_dislikes
+            'likes': comment.likes,
+            'dislikes': comment.dislikes
         })
     
     return JsonResponse({'success': False, 'message': 'Invalid request'})
 
 
 @login_required
+@require_POST
 def delete_comment(request, comment_id):
     """
     删除评论的视图函数
     """
-    comment = get_object_or_404(Comment, id=comment_id)
+    comment = get_object_or_404(Comment.objects.select_related('video'), id=comment_id)
     
     # 检查用户权限
-    if comment.author == request.user or comment.video.uploader == request.user:
-        comment.is_deleted = True
-        comment.save()
-        return JsonResponse({'success': True, 'message': 'Comment deleted'})
+    if request.user.id in (comment.author_id, comment.video.uploader_id):
+        comment.soft_delete()
+        return JsonResponse({
+            'success': True,
+            'message': 'Comment deleted',
+            'comment_count': Video.objects.values_list('comment_count', flat=True).get(pk=comment.video_id)
+        })
     else:
         return JsonResponse({'success': False, 'message': 'Permission denied'})
 
 
 @login_required
+@require_POST
+def restore_comment(request, comment_id):
+    """
+    恢复已删除评论的视图函数
+    """
+    comment = get_object_or_404(Comment.objects.select_related('video'), id=comment_id)
+    
+    if request.user.id not in (comment.author_id, comment.video.uploader_id):
+        return JsonResponse({'success': False, 'message': 'Permission denied'})
+    if comment.is_deleted and not comment.content:
+        # 超过保留期后只剩占位记录，内容已无法恢复
+        return JsonResponse({'success': False, 'message': 'Comment can no longer be restored'})
+    
+    comment.restore()
+    return JsonResponse({
+        'success': True,
+        'message': 'Comment restored',
+        'comment_count': Video.objects.values_list('comment_count', flat=True).get(pk=comment.video_id)
+    })
+
+
+@login_required
+@admission_control('reaction')
 def toggle_comment_reaction(request, comment_id):
     """
     切换评论点赞/点踩的视图函数
@@ -229,33 +241,53 @@ def toggle_comment_reaction(request, comment_id):
         if reaction_type not in ['like', 'dislike']:
             return JsonResponse({'success': False, 'message': 'Invalid reaction type'})
         
-        # 检查是否存在已有反应
-        existing_reaction = CommentReaction.objects.filter(
-            comment=comment,
-            user=request.user
-        ).first()
-        
-        if existing_reaction:
-            if existing_reaction.reaction_type == reaction_type:
-                # 如果是相同的反应类型，则删除
-                existing_reaction.delete()
-            else:
-                # 如果是不同的反应类型，则更新
-                existing_reaction.reaction_type = reaction_type
-                existing_reaction.save()
-        else:
-            # 创建新的反应
-            CommentReaction.objects.create(
-                comment=comment,
-                user=request.user,
-                reaction_type=reaction_type
-            )
+        comment.toggle_reaction(request.user, reaction_type)
         
         # 返回更新后的统计信息
         return JsonResponse({
             'success': True,
-            'likes': comment.total_likes,
-            'dislikes': comment.total_dislikes
+            'likes': comment.likes,
+            'dislikes': comment.dislikes
         })
     
-    return JsonResponse({'success': False, 'message': 'Invalid request'})
\ No newline at end of file
+    return JsonResponse({'success': False, 'message': 'Invalid request'})
+
+
+@require_safe
+def video_comments_api(request, video_id):
+    """
+    视频顶层评论JSON接口（sort=hot/newest，游标分页，附带前几条回复）
+    """
+    video = get_object_or_404(Video, pk=video_id, published=True)
+    sort = request.GET.get('sort', 'hot')
+    if sort not in COMMENT_ORDERINGS:
+        return JsonResponse({'success': False, 'message': 'Invalid sort'}, status=400)
+    try:
+        comments, next_cursor = load_comment_page(video, sort, request.GET.get('cursor'), _page_size(request))
+    except InvalidCursor:
+        return JsonResponse({'success': False, 'message': 'Invalid cursor'}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'comments': [comment_to_dict(comment) for comment in comments],
+        'next_cursor': next_cursor,
+    })
+
+
+@require_safe
+def comment_replies_api(request, comment_id):
+    """
+    评论回复JSON接口（按时间正序，游标分页）
+    """
+    # 已删除的楼主评论以占位显示，楼层中的回复仍可加载
+    comment = get_object_or_404(Comment, pk=comment_id)
+    try:
+        replies, next_cursor = load_replies(comment, request.GET.get('cursor'), _page_size(request))
+    except InvalidCursor:
+        return JsonResponse({'success': False, 'message': 'Invalid cursor'}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'replies': [comment_to_dict(reply) for reply in replies],
+        'next_cursor': next_cursor,
+    })
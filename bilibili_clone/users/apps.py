@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class UsersConfig(AppConfig):
     name = 'users'
+
+    def ready(self):
+        # 注册个人主页摘要缓存的失效信号
+        from . import profile_cache  # noqa: F401
@@ -0,0 +1,11 @@
+from django.conf import settings
+
+
+def notifications(request):
+    """
+    模板中使用的通知设置：是否启用 SSE 推送，以及未启用时轮询未读数的间隔（毫秒）
+    """
+    return {
+        'notification_stream_enabled': getattr(settings, 'NOTIFICATION_STREAM_ENABLED', False),
+        'notification_poll_interval': getattr(settings, 'NOTIFICATION_POLL_INTERVAL', 30) * 1000,
+    }
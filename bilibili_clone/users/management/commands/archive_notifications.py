@@ -0,0 +1,64 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import Notification, NotificationArchive
+
+
+class Command(BaseCommand):
+    help = '分批把超过保留期的已读通知移入归档表（或直接删除），保持通知表精简'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90),
+            help='已读通知保留的天数',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='每个事务处理的通知数')
+        parser.add_argument('--sleep', type=float, default=0.1, help='批次之间暂停的秒数，让出数据库写锁')
+        parser.add_argument('--delete', action='store_true', help='直接删除，不写入归档表')
+        parser.add_argument('--dry-run', action='store_true', help='只统计，不修改')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        batch_size = options['batch_size']
+        processed = 0
+        started = time.monotonic()
+        last_id = 0
+
+        while True:
+            with transaction.atomic():
+                batch = list(Notification.objects.filter(
+                    is_read=True, updated_at__lt=cutoff, pk__gt=last_id,
+                ).order_by('pk').values(
+                    'pk', 'recipient_id', 'notification_type', 'title', 'target_url', 'actor_count', 'created_at',
+                )[:batch_size])
+                if not batch:
+                    break
+                if not options['dry_run']:
+                    if not options['delete']:
+                        NotificationArchive.objects.bulk_create([
+                            NotificationArchive(**{field: value for field, value in row.items() if field != 'pk'})
+                            for row in batch
+                        ])
+                    Notification.objects.filter(pk__in=[row['pk'] for row in batch]).delete()
+
+            processed += len(batch)
+            last_id = batch[-1]['pk']
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'已处理 {processed} 条（{processed / elapsed if elapsed else 0:.0f} 条/秒）')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        elapsed = time.monotonic() - started
+        if options['dry_run']:
+            action = '可处理'
+        else:
+            action = '已删除' if options['delete'] else '已归档'
+        self.stdout.write(self.style.SUCCESS(
+            f'完成：{action} {processed} 条通知，耗时 {elapsed:.1f} 秒'
+            f'（{processed / elapsed if elapsed else 0:.0f} 条/秒）'
+        ))
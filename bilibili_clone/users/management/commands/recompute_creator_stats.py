@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from users.models import UserFollow, UserProfile
+from videos.models import Video
+
+
+
+def _total(queryset, field, aggregate):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('user_id')}).order_by().values(field)
+        .annotate(total=aggregate).values('total'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def _expected_stats():
+    """
+    每个统计字段对应的子查询，在 UPDATE 中按 user_id 重新计算
+    """
+    return {
+        'total_videos': _total(Video.objects.filter(published=True), 'uploader', Count('pk')),
+        'total_views': _total(Video.objects.all(), 'uploader', Sum('view_count')),
+        'total_likes': _total(Video.objects.all(), 'uploader', Sum('like_count')),
+        'follower_count': _total(UserFollow.objects.all(), 'followed', Count('pk')),
+        'following_count': _total(UserFollow.objects.all(), 'follower', Count('pk')),
+    }
+
+
+class Command(BaseCommand):
+    help = '按用户分批重新统计 UserProfile 的视频数、观看数、点赞数和关注数，修正增量更新的偏差'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='每批处理的用户数')
+        parser.add_argument('--dry-run', action='store_true', help='只统计有偏差的用户，不修改')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        total = fixed = 0
+        while True:
+            profiles = list(UserProfile.objects.filter(pk__gt=last_id).order_by('pk')[:batch_size])
+            if not profiles:
+                break
+            user_ids = [profile.user_id for profile in profiles]
+            video_stats = {
+                row['uploader']: row for row in Video.objects.filter(uploader_id__in=user_ids).values('uploader').annotate(
+                    videos=Count('id', filter=Q(published=True)), views=Sum('view_count'), likes=Sum('like_count'),
+                )
+            }
+            followers = dict(UserFollow.objects.filter(followed_id__in=user_ids).values('followed').annotate(
+                n=Count('id')).values_list('followed', 'n'))
+            following = dict(UserFollow.objects.filter(follower_id__in=user_ids).values('follower').annotate(
+                n=Count('id')).values_list('follower', 'n'))
+
+            changed = []
+            for profile in profiles:
+                stats = video_stats.get(profile.user_id, {})
+                expected = {
+                    'total_videos': stats.get('videos') or 0,
+                    'total_views': stats.get('views') or 0,
+                    'total_likes': stats.get('likes') or 0,
+                    'follower_count': followers.get(profile.user_id, 0),
+                    'following_count': following.get(profile.user_id, 0),
+                }
+                if any(getattr(profile, field) != value for field, value in expected.items()):
+                    changed.append(profile.pk)
+            if changed and not options['dry_run']:
+                # 用子查询在同一条 UPDATE 中重新统计，避免覆盖读取之后发生的增量更新
+                UserProfile.objects.filter(pk__in=changed).update(**_expected_stats())
+
+            total += len(profiles)
+            fixed += len(changed)
+            last_id = profiles[-1].pk
+            self.stdout.write(f'已处理 {total} 个用户，修正 {fixed} 个')
+        action = '需要修正' if options['dry_run'] else '修正'
+        self.stdout.write(self.style.SUCCESS(f'统计重算完成，共 {total} 个用户，{action} {fixed} 个'))
@@ -0,0 +1,69 @@
+# Generated by Django 6.0 on 2026-10-18 12:00
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def copy_m2m_follows(apps, schema_editor):
+    """
+    把 UserProfile.followers / following 中的关系合并到 UserFollow
+    """
+    UserProfile = apps.get_model('users', 'UserProfile')
+    UserFollow = apps.get_model('users', 'UserFollow')
+    pairs = set()
+    # profile.followers 是关注了该用户的人，profile.following 是该用户关注的人
+    for profile_user_id, follower_id in UserProfile.followers.through.objects.values_list(
+        'userprofile__user_id', 'user_id'
+    ).iterator():
+        pairs.add((follower_id, profile_user_id))
+    for profile_user_id, followed_id in UserProfile.following.through.objects.values_list(
+        'userprofile__user_id', 'user_id'
+    ).iterator():
+        pairs.add((profile_user_id, followed_id))
+    UserFollow.objects.bulk_create(
+        [UserFollow(follower_id=a, followed_id=b) for a, b in pairs if a != b],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+def backfill_follow_counts(apps, schema_editor):
+    UserProfile = apps.get_model('users', 'UserProfile')
+    UserFollow = apps.get_model('users', 'UserFollow')
+    followers = dict(UserFollow.objects.values('followed').annotate(n=Count('id')).values_list('followed', 'n'))
+    following = dict(UserFollow.objects.values('follower').annotate(n=Count('id')).values_list('follower', 'n'))
+    for user_id in set(followers) | set(following):
+        UserProfile.objects.filter(user_id=user_id).update(
+            follower_count=followers.get(user_id, 0),
+            following_count=following.get(user_id, 0),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_notification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(copy_m2m_follows, migrations.RunPython.noop),
+        migrations.RunPython(backfill_follow_counts, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='followers',
+        ),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='following',
+        ),
+    ]
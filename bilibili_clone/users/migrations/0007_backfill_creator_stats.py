@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-18 12:00
+
+from django.db import migrations
+from django.db.models import Count, Q, Sum
+
+
+def backfill_creator_stats(apps, schema_editor):
+    """
+    用已有的视频重新计算 UserProfile 的 total_videos/total_views/total_likes
+    """
+    UserProfile = apps.get_model('users', 'UserProfile')
+    Video = apps.get_model('videos', 'Video')
+    stats = Video.objects.values('uploader').annotate(
+        videos=Count('id', filter=Q(published=True)), views=Sum('view_count'), likes=Sum('like_count'),
+    ).values_list('uploader', 'videos', 'views', 'likes')
+    for uploader_id, videos, views, likes in stats.iterator():
+        UserProfile.objects.filter(user_id=uploader_id).update(
+            total_videos=videos, total_views=views or 0, total_likes=likes or 0,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_notification_archive'),
+        ('videos', '0011_feed_entry'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_creator_stats, migrations.RunPython.noop),
+    ]
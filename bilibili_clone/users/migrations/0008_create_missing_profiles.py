@@ -0,0 +1,47 @@
+# Generated by Django 6.0 on 2026-10-18 12:00
+
+from django.db import migrations
+from django.db.models import Count, Q, Sum
+
+
+def create_missing_profiles(apps, schema_editor):
+    """
+    为没有 UserProfile 的旧账号补建资料，并按已有的视频和关注关系填写统计字段
+    """
+    User = apps.get_model('auth', 'User')
+    UserProfile = apps.get_model('users', 'UserProfile')
+    Video = apps.get_model('videos', 'Video')
+    UserFollow = apps.get_model('users', 'UserFollow')
+    user_ids = list(User.objects.filter(userprofile__isnull=True).values_list('id', flat=True))
+    for start in range(0, len(user_ids), 500):
+        batch = user_ids[start:start + 500]
+        video_stats = {
+            uploader_id: (videos, views or 0, likes or 0)
+            for uploader_id, videos, views, likes in Video.objects.filter(uploader_id__in=batch).values(
+                'uploader').annotate(
+                videos=Count('id', filter=Q(published=True)), views=Sum('view_count'), likes=Sum('like_count'),
+            ).values_list('uploader', 'videos', 'views', 'likes')
+        }
+        followers = dict(UserFollow.objects.filter(followed_id__in=batch).values('followed').annotate(
+            n=Count('id')).values_list('followed', 'n'))
+        following = dict(UserFollow.objects.filter(follower_id__in=batch).values('follower').annotate(
+            n=Count('id')).values_list('follower', 'n'))
+        profiles = []
+        for user_id in batch:
+            videos, views, likes = video_stats.get(user_id, (0, 0, 0))
+            profiles.append(UserProfile(
+                user_id=user_id, total_videos=videos, total_views=views, total_likes=likes,
+                follower_count=followers.get(user_id, 0), following_count=following.get(user_id, 0),
+            ))
+        UserProfile.objects.bulk_create(profiles)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_backfill_creator_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_profiles, migrations.RunPython.noop),
+    ]
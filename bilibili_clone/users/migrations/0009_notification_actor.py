@@ -0,0 +1,50 @@
+# Generated by Django 6.0 on 2026-10-18 12:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_actors(apps, schema_editor):
+    """
+    已有聚合通知的发送者只知道最近的几个，按 recent_actors 和 sender 补录
+    """
+    Notification = apps.get_model('users', 'Notification')
+    NotificationActor = apps.get_model('users', 'NotificationActor')
+    User = apps.get_model('auth', 'User')
+    notifications = Notification.objects.exclude(aggregate_key='').values_list('pk', 'sender_id', 'recent_actors')
+    batch = []
+    for pk, sender_id, recent_actors in notifications.iterator():
+        actors = set(recent_actors or [])
+        if sender_id is not None:
+            actors.add(sender_id)
+        batch.extend((pk, actor_id) for actor_id in actors)
+    existing = set(User.objects.filter(pk__in={actor_id for _, actor_id in batch}).values_list('pk', flat=True))
+    NotificationActor.objects.bulk_create(
+        [NotificationActor(notification_id=pk, actor_id=actor_id) for pk, actor_id in batch if actor_id in existing],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_create_missing_profiles'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationActor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='actors', to='users.notification')),
+            ],
+            options={
+                'unique_together': {('notification', 'actor')},
+            },
+        ),
+        migrations.RunPython(backfill_actors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-18 12:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_feed_pulled(apps, schema_editor):
+    """
+    粉丝数已达到阈值的UP主在读取时合并
+    """
+    UserProfile = apps.get_model('users', 'UserProfile')
+    UserProfile.objects.filter(
+        follower_count__gte=getattr(settings, 'FEED_FANOUT_THRESHOLD', 10000),
+    ).update(feed_pulled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_notification_actor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='feed_pulled',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(backfill_feed_pulled, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
 
 
 class UserProfile(models.Model):
@@ -10,44 +12,36 @@ class UserProfile(models.Model):
     location = models.CharField(max_length=30, blank=True)
     birth_date = models.DateField(null=True, blank=True)
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
-    followers = models.ManyToManyField(User, related_name='following', blank=True)
-    following = models.ManyToManyField(User, related_name='followers', blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     verified = models.BooleanField(default=False)  # 认证标识
-    total_videos = models.PositiveIntegerField(default=0)  # 总视频数
-    total_views = models.PositiveIntegerField(default=0)  # 总观看数
-    total_likes = models.PositiveIntegerField(default=0)  # 总点赞数
+    total_videos = models.PositiveIntegerField(default=0)  # 已发布视频数
+    total_views = models.PositiveIntegerField(default=0)  # 所有视频的观看数之和
+    total_likes = models.PositiveIntegerField(default=0)  # 所有视频的点赞数之和
+    follower_count = models.PositiveIntegerField(default=0)  # 关注者数，随 UserFollow 更新
+    following_count = models.PositiveIntegerField(default=0)  # 关注数，随 UserFollow 更新
+    feed_pulled = models.BooleanField(default=False)  # 关注动态中是否在读取时合并（粉丝数达到阈值），否则推送到收件箱
     
     def __str__(self):
         return f'{self.user.username} Profile'
     
-    @property
-    def follower_count(self):
-        return self.followers.count()
-    
-    @property
-    def following_count(self):
-        return self.following.count()
-    
-    @property
-    def video_count(self):
-        return self.user.uploaded_videos.count()
+    @classmethod
+    def add_stats(cls, user_id, **deltas):
+        """
+        按增量更新统计字段，例如 add_stats(uid, total_views=3)；单条 F() UPDATE
+        """
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if deltas:
+            cls.objects.filter(user_id=user_id).update(**{field: F(field) + delta for field, delta in deltas.items()})
 
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
-
-
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    try:
-        instance.userprofile.save()
-    except AttributeError:
-        # Create profile if it doesn't exist
-        UserProfile.objects.create(user=instance)
+    else:
+        # 资料被删除的账号在下次保存（例如登录）时补建，已有资料不重复保存
+        UserProfile.objects.get_or_create(user=instance)
 
 
 class UserFollow(models.Model):
@@ -63,6 +57,34 @@ class UserFollow(models.Model):
     
     def __str__(self):
         return f'{self.follower.username} follows {self.followed.username}'
+    
+    @classmethod
+    def follow(cls, follower, followed):
+        """
+        建立关注关系，并在同一事务中更新双方的计数；返回是否新建
+        """
+        with transaction.atomic():
+            _, created = cls.objects.get_or_create(follower=follower, followed=followed)
+            if created:
+                UserProfile.objects.filter(user=followed).update(follower_count=F('follower_count') + 1)
+                UserProfile.objects.filter(user=follower).update(following_count=F('following_count') + 1)
+        return created
+    
+    @classmethod
+    def unfollow(cls, follower, followed):
+        """
+        取消关注关系，并在同一事务中更新双方的计数；返回是否删除
+        """
+        with transaction.atomic():
+            deleted, _ = cls.objects.filter(follower=follower, followed=followed).delete()
+            if deleted:
+                UserProfile.objects.filter(user=followed).update(follower_count=F('follower_count') - 1)
+                UserProfile.objects.filter(user=follower).update(following_count=F('following_count') - 1)
+        return bool(deleted)
+    
+    @classmethod
+    def is_following(cls, follower, followed):
+        return cls.objects.filter(follower=follower, followed=followed).exists()
 
 
 class Notification(models.Model):
@@ -85,9 +107,19 @@ class Notification(models.Model):
     target_url = models.URLField(max_length=500, blank=True)  # 可选的目标链接
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # 聚合通知：同一 aggregate_key（如 like:video:12）在时间窗口内合并为一条
+    aggregate_key = models.CharField(max_length=100, blank=True)
+    actor_count = models.PositiveIntegerField(default=1)
+    recent_actors = models.JSONField(default=list, blank=True)  # 最近的几个发送者ID，最新的在前
+    updated_at = models.DateTimeField(default=timezone.now)  # 最后一次合并的时间
     
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['recipient', 'aggregate_key', 'updated_at'], name='notification_aggregate_idx'),
+            models.Index(fields=['recipient', '-updated_at', '-id'], name='notification_inbox_idx'),
+            models.Index(fields=['updated_at'], condition=Q(is_read=True), name='notification_read_idx'),
+        ]
     
     def __str__(self):
         return f'{self.recipient.username}: {self.title}'
@@ -96,3 +128,33 @@ class Notification(models.Model):
         """标记通知为已读"""
         self.is_read = True
         self.save()
+
+
+class NotificationActor(models.Model):
+    """
+    聚合通知的全部发送者，每个发送者只计数一次
+    """
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='actors')
+    actor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    
+    class Meta:
+        unique_together = ('notification', 'actor')
+
+
+class NotificationArchive(models.Model):
+    """
+    归档的通知（已读且超过保留期），只保留展示所需的字段
+    """
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_notifications')
+    notification_type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES)
+    title = models.CharField(max_length=200)
+    target_url = models.URLField(max_length=500, blank=True)
+    actor_count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField()  # 原通知的创建时间
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f'{self.recipient.username}: {self.title}'
@@ -0,0 +1,266 @@
+"""
+通知异步分发
+
+视图只调用 notifier.notify() 把通知放入内存缓冲区，后台线程批量 bulk_create。
+同一发送者对同一接收者、同一目标的同类通知只保留一条：缓冲区内按 key 去重，
+落库前再排除时间窗口内已存在的未读通知（例如反复点赞/取消点赞）。
+带 aggregate_key 的通知（点赞、评论）在时间窗口内合并到同一条未读通知上，
+只更新发送者数和最近的几个发送者（“A、B 等N人点赞了你的视频”）；
+全部发送者记录在 NotificationActor 中，同一个人重复点赞只计一次。
+写入后同步更新接收者的未读计数缓存，并推送给接收者的 SSE 连接。
+接收者或发送者在落库前已被删除的通知直接丢弃，不放回缓冲区重试。
+"""
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from bilibili_clone.write_behind import WriteBehindBuffer, existing_ids
+from .models import Notification, NotificationActor
+from .stream import push_unread
+from .unread import incr_unread, invalidate_unread
+
+logger = logging.getLogger(__name__)
+
+CREATE = 'create'
+RETRACT = 'retract'
+
+# 聚合通知中保留的最近发送者数
+RECENT_ACTORS = 3
+
+
+def aggregate_title(names, actor_count, verb):
+    """
+    names 为最近的发送者用户名（最新的在前）
+    """
+    if actor_count == 1:
+        return f'{names[0]} {verb}'
+    if actor_count == 2 and len(names) == 2:
+        return f'{names[0]}、{names[1]} {verb}'
+    return f'{"、".join(names[:2])} 等{actor_count}人{verb}'
+
+
+class NotificationDispatcher(WriteBehindBuffer):
+    name = 'notification-dispatcher'
+
+    def __init__(self, dedupe_window=3600, aggregate_window=86400, **kwargs):
+        super().__init__(**kwargs)
+        self.dedupe_window = dedupe_window
+        self.aggregate_window = aggregate_window
+
+    def notify(self, recipient_id, sender_id, notification_type, title, message, target_url='',
+               aggregate_key='', verb=''):
+        """
+        发送通知；发给自己的通知直接忽略
+
+        指定 aggregate_key 时同一目标的通知会合并，标题由发送者和 verb 生成
+        """
+        if recipient_id == sender_id:
+            return
+        identity = (recipient_id, sender_id, notification_type, target_url)
+        self.add((CREATE,) + identity, {
+            'action': CREATE,
+            'recipient_id': recipient_id,
+            'sender_id': sender_id,
+            'notification_type': notification_type,
+            'title': title,
+            'message': message,
+            'target_url': target_url,
+            'aggregate_key': aggregate_key,
+            'verb': verb,
+        })
+
+    def retract(self, recipient_id, sender_id, notification_type, target_url=None):
+        """
+        撤回通知（例如取消关注）：丢弃尚未写入的通知，并删除已写入的通知
+        """
+        for key in self._pending_keys():
+            if key[0] == CREATE and key[1:4] == (recipient_id, sender_id, notification_type) and (
+                target_url is None or key[4] == target_url
+            ):
+                self.discard(key)
+        self.add((RETRACT, recipient_id, sender_id, notification_type, target_url), {
+            'action': RETRACT,
+            'recipient_id': recipient_id,
+            'sender_id': sender_id,
+            'notification_type': notification_type,
+            'target_url': target_url,
+        })
+
+    def _pending_keys(self):
+        with self._lock:
+            return list(self._pending)
+
+    def write(self, entries):
+        # 先删除再创建，保证“取消后重新关注”能留下新的通知
+        retractions = [entry for entry in entries if entry['action'] == RETRACT]
+        creations = [
+            {field: value for field, value in entry.items() if field != 'action'}
+            for entry in entries if entry['action'] == CREATE
+        ]
+        creations = self._exclude_missing(creations)
+        with transaction.atomic():
+            for entry in retractions:
+                notifications = Notification.objects.filter(
+                    recipient_id=entry['recipient_id'],
+                    sender_id=entry['sender_id'],
+                    notification_type=entry['notification_type'],
+                )
+                if entry['target_url'] is not None:
+                    notifications = notifications.filter(target_url=entry['target_url'])
+                notifications.delete()
+            plain = self._exclude_duplicates([entry for entry in creations if not entry['aggregate_key']])
+            Notification.objects.bulk_create(
+                [Notification(**self._fields(entry)) for entry in plain],
+                batch_size=500,
+            )
+            created, merged = self._aggregate([entry for entry in creations if entry['aggregate_key']])
+        created += plain
+        # 撤回的通知可能是未读的，直接让这些用户的计数失效
+        invalidate_unread({entry['recipient_id'] for entry in retractions})
+        incr_unread(Counter(entry['recipient_id'] for entry in created))
+        changed = created + merged
+        for recipient_id in {entry['recipient_id'] for entry in retractions + changed}:
+            push_unread(recipient_id, [entry for entry in changed if entry['recipient_id'] == recipient_id])
+        return len(retractions) + len(creations)
+
+    @staticmethod
+    def _fields(entry):
+        return {field: value for field, value in entry.items() if field != 'verb'}
+
+    def _aggregate(self, entries):
+        """
+        合并聚合通知，返回 (新建的通知, 被合并更新的通知)
+
+        一次查询取出窗口内仍未读的聚合通知，已存在的用条件 UPDATE 单行更新
+        （actor_count 未被其他进程修改时才生效，否则重新读取后重试），
+        否则新建一条。
+        """
+        if not entries:
+            return [], []
+        groups = {}
+        for entry in entries:
+            groups.setdefault((entry['recipient_id'], entry['aggregate_key']), []).append(entry)
+        existing = {
+            (notification.recipient_id, notification.aggregate_key): notification
+            for notification in Notification.objects.filter(
+                recipient_id__in={recipient_id for recipient_id, _ in groups},
+                aggregate_key__in={key for _, key in groups},
+                updated_at__gte=timezone.now() - timedelta(seconds=self.aggregate_window),
+                is_read=False,
+            ).order_by('updated_at')
+        }
+        actor_ids = {entry['sender_id'] for entry in entries}
+        for notification in existing.values():
+            actor_ids.update(notification.recent_actors)
+        names = dict(User.objects.filter(id__in=actor_ids).values_list('id', 'username'))
+
+        created, merged, to_create, new_actors = [], [], [], []
+        for key, group in groups.items():
+            latest = group[-1]
+            senders = []
+            for entry in reversed(group):
+                if entry['sender_id'] not in senders:
+                    senders.append(entry['sender_id'])
+            notification = existing.get(key)
+            if notification is not None and self._merge(notification, senders, latest, names):
+                merged.append(dict(latest, title=notification.title))
+                continue
+            title = aggregate_title([names.get(i, '') for i in senders[:2]], len(senders), latest['verb'])
+            notification = Notification(
+                **dict(self._fields(latest), title=title),
+                actor_count=len(senders),
+                recent_actors=senders[:RECENT_ACTORS],
+            )
+            to_create.append(notification)
+            new_actors.extend(NotificationActor(notification=notification, actor_id=actor) for actor in senders)
+            created.append(dict(latest, title=title))
+        Notification.objects.bulk_create(to_create, batch_size=500)
+        NotificationActor.objects.bulk_create(new_actors, batch_size=500)
+        return created, merged
+
+    def _merge(self, notification, senders, latest, names, attempts=3):
+        """
+        把新的发送者合并到已有的聚合通知上，返回是否成功（通知已被读过则返回 False）
+
+        已经在 NotificationActor 中的发送者不再计数
+        """
+        for _ in range(attempts):
+            known = set(NotificationActor.objects.filter(
+                notification=notification, actor_id__in=senders,
+            ).values_list('actor_id', flat=True))
+            new_actors = [actor for actor in senders if actor not in known]
+            if not new_actors:
+                return True
+            actor_count = notification.actor_count + len(new_actors)
+            recent_actors = (new_actors + notification.recent_actors)[:RECENT_ACTORS]
+            missing = [actor for actor in recent_actors[:2] if actor not in names]
+            if missing:
+                names.update(User.objects.filter(id__in=missing).values_list('id', 'username'))
+            title = aggregate_title([names.get(actor, '') for actor in recent_actors[:2]], actor_count, latest['verb'])
+            updated = Notification.objects.filter(
+                pk=notification.pk, actor_count=notification.actor_count, is_read=False,
+            ).update(
+                actor_count=actor_count,
+                recent_actors=recent_actors,
+                sender_id=latest['sender_id'],
+                title=title,
+                message=latest['message'],
+                target_url=latest['target_url'],
+                updated_at=timezone.now(),
+            )
+            if updated:
+                NotificationActor.objects.bulk_create(
+                    [NotificationActor(notification=notification, actor_id=actor) for actor in new_actors],
+                    ignore_conflicts=True,
+                )
+                notification.title = title
+                return True
+            notification.refresh_from_db(fields=['actor_count', 'recent_actors', 'is_read'])
+            if notification.is_read:
+                return False
+        return False
+
+    def _exclude_missing(self, entries):
+        """
+        丢弃接收者或发送者已被删除的通知，否则外键约束会让整批写入失败
+        """
+        user_ids = existing_ids(
+            User, {entry['recipient_id'] for entry in entries} | {entry['sender_id'] for entry in entries},
+        )
+        valid = [
+            entry for entry in entries
+            if entry['recipient_id'] in user_ids and (entry['sender_id'] is None or entry['sender_id'] in user_ids)
+        ]
+        if len(valid) < len(entries):
+            logger.warning('%s dropped %d notifications of deleted users', self.name, len(entries) - len(valid))
+        return valid
+
+    def _exclude_duplicates(self, entries):
+        """
+        排除时间窗口内已存在的相同未读通知（一次查询）
+        """
+        if not entries:
+            return entries
+        existing = set(Notification.objects.filter(
+            recipient_id__in={entry['recipient_id'] for entry in entries},
+            created_at__gte=timezone.now() - timedelta(seconds=self.dedupe_window),
+            is_read=False,
+        ).values_list('recipient_id', 'sender_id', 'notification_type', 'target_url'))
+        return [
+            entry for entry in entries
+            if (entry['recipient_id'], entry['sender_id'], entry['notification_type'], entry['target_url'])
+            not in existing
+        ]
+
+
+notifier = NotificationDispatcher(
+    dedupe_window=getattr(settings, 'NOTIFICATION_DEDUPE_WINDOW', 3600),
+    aggregate_window=getattr(settings, 'NOTIFICATION_AGGREGATE_WINDOW', 86400),
+    flush_interval=getattr(settings, 'NOTIFICATION_FLUSH_INTERVAL', 2.0),
+    max_pending=getattr(settings, 'NOTIFICATION_MAX_PENDING', 500),
+)
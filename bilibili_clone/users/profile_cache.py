@@ -0,0 +1,149 @@
+"""
+个人主页摘要缓存
+
+个人主页需要的数据（头像、认证标识、各项计数、最近的6个视频）整理成一个
+字典缓存起来，键为用户ID；用户名到ID的映射单独缓存。相关数据变化时只删除
+受影响用户的缓存（在事务提交后删除，避免并发请求把旧数据重新写回缓存）：
+
+    UserProfile 保存          该用户
+    用户名修改、用户删除       该用户及旧用户名映射
+    关注/取消关注              双方
+    视频创建/修改/删除         上传者
+    点赞/点踩                  视频上传者
+    观看记录落库               由 view_buffer 调用 invalidate_profiles
+
+视频卡片上的评论数不触发失效，随缓存过期刷新。
+
+失效只对使用同一缓存的进程可见：默认的本地内存缓存下，其他进程会继续
+使用旧摘要直到过期（PROFILE_CACHE_TIMEOUT），多进程部署需要在 CACHES
+中配置 Redis 等共享缓存。
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from videos.models import Video, VideoReaction
+from .models import UserFollow, UserProfile
+
+RECENT_VIDEOS = 6
+
+
+def _summary_key(user_id):
+    return f'profile:summary:{user_id}'
+
+
+def _username_key(username):
+    return f'profile:username:{username}'
+
+
+def _timeout():
+    return getattr(settings, 'PROFILE_CACHE_TIMEOUT', 300)
+
+
+def get_user_id(username):
+    """
+    用户名对应的用户ID，用户不存在时返回 None
+    """
+    user_id = cache.get(_username_key(username))
+    if user_id is None:
+        user_id = User.objects.filter(username=username).values_list('id', flat=True).first()
+        if user_id is not None:
+            cache.set(_username_key(username), user_id, _timeout())
+    return user_id
+
+
+def get_profile_summary(user_id):
+    """
+    返回个人主页摘要，用户不存在时返回 None
+    """
+    summary = cache.get(_summary_key(user_id))
+    if summary is None:
+        summary = build_profile_summary(user_id)
+        if summary is not None:
+            cache.set(_summary_key(user_id), summary, _timeout())
+    return summary
+
+
+def build_profile_summary(user_id):
+    user = User.objects.filter(pk=user_id).first()
+    if user is None:
+        return None
+    profile, _ = UserProfile.objects.get_or_create(user=user)
+    videos = Video.objects.filter(uploader_id=user_id, published=True).order_by('-upload_date', '-id')[:RECENT_VIDEOS]
+    return {
+        'user_id': user.id,
+        'username': user.username,
+        'avatar_url': profile.avatar.url if profile.avatar else '',
+        'verified': profile.verified,
+        'bio': profile.bio,
+        'location': profile.location,
+        'created_at': profile.created_at,
+        'follower_count': profile.follower_count,
+        'following_count': profile.following_count,
+        'total_videos': profile.total_videos,
+        'total_views': profile.total_views,
+        'total_likes': profile.total_likes,
+        'recent_videos': [
+            {
+                'id': video.id,
+                'title': video.title,
+                'thumbnail': video.card_thumbnail.url if video.card_thumbnail else '',
+                'view_count': video.view_count,
+                'comment_count': video.comment_count,
+            }
+            for video in videos
+        ],
+    }
+
+
+def invalidate_profiles(user_ids):
+    """
+    删除这些用户的主页摘要缓存（在当前事务提交后执行）
+    """
+    keys = [_summary_key(user_id) for user_id in set(user_ids) if user_id is not None]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_on_profile_change(sender, instance, **kwargs):
+    invalidate_profiles([instance.user_id])
+
+
+@receiver(pre_save, sender=User)
+def invalidate_on_rename(sender, instance, update_fields=None, **kwargs):
+    # 登录只更新 last_login，不需要查询旧用户名
+    if instance.pk is None or (update_fields is not None and 'username' not in update_fields):
+        return
+    old_username = User.objects.filter(pk=instance.pk).values_list('username', flat=True).first()
+    if old_username is not None and old_username != instance.username:
+        transaction.on_commit(lambda: cache.delete(_username_key(old_username)))
+        invalidate_profiles([instance.pk])
+
+
+@receiver(post_delete, sender=User)
+def invalidate_on_user_delete(sender, instance, **kwargs):
+    transaction.on_commit(lambda: cache.delete(_username_key(instance.username)))
+    invalidate_profiles([instance.pk])
+
+
+@receiver(post_save, sender=UserFollow)
+@receiver(post_delete, sender=UserFollow)
+def invalidate_on_follow_change(sender, instance, **kwargs):
+    invalidate_profiles([instance.follower_id, instance.followed_id])
+
+
+@receiver(post_save, sender=Video)
+@receiver(post_delete, sender=Video)
+def invalidate_on_video_change(sender, instance, **kwargs):
+    invalidate_profiles([instance.uploader_id])
+
+
+@receiver(post_save, sender=VideoReaction)
+@receiver(post_delete, sender=VideoReaction)
+def invalidate_on_reaction_change(sender, instance, **kwargs):
+    invalidate_profiles(Video.objects.filter(pk=instance.video_id).values_list('uploader_id', flat=True))
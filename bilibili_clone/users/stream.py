@@ -0,0 +1,71 @@
+"""
+通知推送（Server-Sent Events）
+
+每个用户一个频道 notifications:<用户ID>。通知写入或已读状态变化时发布
+{'unread': 未读数, 'notifications': [新通知...]}，SSE 连接把它转成
+notification / unread 事件；没有消息时每隔一段时间发送一行注释保持连接。
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from bilibili_clone.pubsub import get_broker, publish
+from .unread import get_unread_count
+
+
+def channel_name(user_id):
+    return f'notifications:{user_id}'
+
+
+def notification_to_dict(notification):
+    return {
+        'notification_type': notification['notification_type'],
+        'title': notification['title'],
+        'message': notification['message'],
+        'target_url': notification['target_url'],
+    }
+
+
+def has_subscribers(user_id):
+    """
+    用户是否可能有打开的推送连接；未启用 NOTIFICATION_STREAM_ENABLED 时总是 False
+    """
+    if not getattr(settings, 'NOTIFICATION_STREAM_ENABLED', False):
+        return False
+    return get_broker().has_subscribers(channel_name(user_id))
+
+
+def push_unread(user_id, notifications=()):
+    """
+    把用户最新的未读数（以及新通知）推送给该用户的所有连接；
+    没有连接时直接返回，不查询未读数
+    """
+    if not has_subscribers(user_id):
+        return
+    publish(channel_name(user_id), {
+        'unread': get_unread_count(user_id),
+        'notifications': [notification_to_dict(notification) for notification in notifications],
+    })
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+async def event_stream(user_id, heartbeat=15):
+    # 先订阅再读取初始未读数，避免漏掉两者之间发布的消息
+    subscription = get_broker().subscribe(channel_name(user_id))
+    try:
+        yield 'retry: 5000\n\n'
+        yield format_event('unread', {'unread': await sync_to_async(get_unread_count)(user_id)})
+        while True:
+            message = await subscription.get(heartbeat)
+            if message is None:
+                yield ': ping\n\n'
+                continue
+            for notification in message['notifications']:
+                yield format_event('notification', notification)
+            yield format_event('unread', {'unread': message['unread']})
+    finally:
+        subscription.close()
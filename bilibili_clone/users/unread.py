@@ -0,0 +1,50 @@
+"""
+未读通知计数缓存
+
+每个用户的未读数存放在缓存中：通知写入时增加，标记已读时减少。
+缓存项带有过期时间，过期后下一次读取重新 COUNT 一次，
+以此修正多进程本地缓存、撤回通知等造成的偏差。
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Notification
+
+
+def _cache_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def _timeout():
+    return getattr(settings, 'NOTIFICATION_UNREAD_TTL', 300)
+
+
+def get_unread_count(user_id):
+    count = cache.get(_cache_key(user_id))
+    if count is None:
+        count = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+        cache.set(_cache_key(user_id), count, _timeout())
+    return count
+
+
+def incr_unread(counts):
+    """
+    counts: {用户ID: 新增的未读数}；没有缓存的用户跳过，下次读取时从数据库计算
+    """
+    for user_id, delta in counts.items():
+        try:
+            cache.incr(_cache_key(user_id), delta)
+        except ValueError:
+            pass
+
+
+def decr_unread(user_id, delta=1):
+    try:
+        if cache.decr(_cache_key(user_id), delta) < 0:
+            cache.delete(_cache_key(user_id))
+    except ValueError:
+        pass
+
+
+def invalidate_unread(user_ids):
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids])
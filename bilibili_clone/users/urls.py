@@ -11,6 +11,8 @@ urlpatterns = [
     path('unfollow/<int:user_id>/', views.unfollow_user, name='unfollow_user'),
     path('toggle-follow/<int:user_id>/', views.toggle_follow, name='toggle_follow'),
     path('notifications/', views.notifications, name='notifications'),
+    path('notifications/api/', views.notifications_api, name='notifications_api'),
     path('notifications/<int:notification_id>/read/', views.mark_notification_read, name='mark_notification_read'),
     path('notifications/unread-count/', views.unread_notifications_count, name='unread_notifications_count'),
+    path('notifications/stream/', views.notification_stream, name='notification_stream'),
 ]
\ No newline at end of file
@@ -2,31 +2,47 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_safe
+from videos.pagination import InvalidCursor, paginate
 from .models import UserProfile, UserFollow, Notification
+from .notifier import notifier
+from .profile_cache import get_profile_summary, get_user_id
+from .stream import event_stream, push_unread
+from .unread import decr_unread, get_unread_count
+
+
+def _render_profile(request, user_id):
+    profile = get_profile_summary(user_id) if user_id is not None else None
+    if profile is None:
+        raise Http404('User not found')
+    is_following = (
+        request.user.is_authenticated
+        and request.user.id != user_id
+        and UserFollow.is_following(request.user.id, user_id)
+    )
+    
+    context = {
+        'profile': profile,
+        'is_following': is_following,
+    }
+    return render(request, 'users/profile.html', context)
 
 
 def profile(request, user_id):
     """
-    用户个人资料页面（与profile_view同名函数，为URL兼容）
+    用户个人资料页面（按用户ID）
     """
-    user = get_object_or_404(User, id=user_id)
-    # 如果用户ID不匹配用户名，尝试通过用户名重定向
-    return profile_view(request, user.username)
+    return _render_profile(request, user_id)
 
 
 def profile_view(request, username):
     """
-    用户个人资料页面
+    用户个人资料页面（按用户名），页面数据来自缓存的主页摘要
     """
-    user = get_object_or_404(User, username=username)
-    user_profile = user.userprofile
-    
-    context = {
-        'profile_user': user,
-        'user_profile': user_profile,
-    }
-    return render(request, 'users/profile.html', context)
+    return _render_profile(request, get_user_id(username))
 
 
 @login_required
@@ -34,7 +50,7 @@ def edit_profile(request):
     """
     编辑个人资料页面
     """
-    profile = request.user.userprofile
+    profile, _ = UserProfile.objects.get_or_create(user=request.user)
     
     if request.method == 'POST':
         profile.bio = request.POST.get('bio', '')
@@ -44,8 +60,9 @@ def edit_profile(request):
         if 'avatar' in request.FILES:
             profile.avatar = request.FILES['avatar']
         
-        profile.save()
-        return redirect('profile', username=request.user.username)
+        # 只保存表单字段，避免覆盖并发更新的计数
+        profile.save(update_fields=['bio', 'location', 'birth_date', 'avatar', 'updated_at'])
+        return redirect('users:profile_view', username=request.user.username)
     
     context = {
         'user_profile': profile,
@@ -53,6 +70,10 @@ def edit_profile(request):
     return render(request, 'users/edit_profile.html', context)
 
 
+def _follower_count(user):
+    return UserProfile.objects.filter(user=user).values_list('follower_count', flat=True).first() or 0
+
+
 @login_required
 def follow_user(request, user_id):
     """
@@ -64,25 +85,13 @@ def follow_user(request, user_id):
         if user_to_follow == request.user:
             return JsonResponse({'success': False, 'message': 'Cannot follow yourself'})
         
-        # 检查是否已经关注
-        follow, created = UserFollow.objects.get_or_create(
-            follower=request.user,
-            followed=user_to_follow
-        )
-        
-        if not created:  # 如果关系已存在，说明已经关注了
-            return JsonResponse({
-                'success': True,
-                'following': True,
-                'message': 'Already following',
-                'follower_count': user_to_follow.userprofile.follower_count
-            })
+        created = UserFollow.follow(request.user, user_to_follow)
         
         return JsonResponse({
             'success': True,
             'following': True,
-            'message': 'Followed successfully',
-            'follower_count': user_to_follow.userprofile.follower_count
+            'message': 'Followed successfully' if created else 'Already following',
+            'follower_count': _follower_count(user_to_follow)
         })
     
     return JsonResponse({'success': False, 'message': 'Invalid request'})
@@ -96,27 +105,14 @@ def unfollow_user(request, user_id):
     if request.method == 'POST':
         user_to_unfollow = get_object_or_404(User, id=user_id)
         
-        # 尝试删除关注关系
-        try:
-            follow = UserFollow.objects.get(
-                follower=request.user,
-                followed=user_to_unfollow
-            )
-            follow.delete()
-            
-            return JsonResponse({
-                'success': True,
-                'following': False,
-                'message': 'Unfollowed successfully',
-                'follower_count': user_to_unfollow.userprofile.follower_count
-            })
-        except UserFollow.DoesNotExist:
-            return JsonResponse({
-                'success': True,
-                'following': False,
-                'message': 'Not following user',
-                'follower_count': user_to_unfollow.userprofile.follower_count
-            })
+        deleted = UserFollow.unfollow(request.user, user_to_unfollow)
+        
+        return JsonResponse({
+            'success': True,
+            'following': False,
+            'message': 'Unfollowed successfully' if deleted else 'Not following user',
+            'follower_count': _follower_count(user_to_unfollow)
+        })
     
     return JsonResponse({'success': False, 'message': 'Invalid request'})
 
@@ -132,83 +128,157 @@ def toggle_follow(request, user_id):
         if user_to_follow == request.user:
             return JsonResponse({'success': False, 'message': 'Cannot follow yourself'})
         
-        follow, created = UserFollow.objects.get_or_create(
-            follower=request.user,
-            followed=user_to_follow
-        )
-        
-        if not created:  # 如果关系已存在，删除它（取消关注）
-            follow.delete()
+        if UserFollow.unfollow(request.user, user_to_follow):  # 已经关注，取消关注
             following = False
             message = 'Unfollowed successfully'
             
-            # 删除关注通知
-            Notification.objects.filter(
-                recipient=user_to_follow,
-                sender=request.user,
-                notification_type='follow'
-            ).delete()
-        else:  # 如果关系不存在，创建它（关注）
+            # 撤回关注通知
+            notifier.retract(user_to_follow.id, request.user.id, 'follow')
+        else:
+            UserFollow.follow(request.user, user_to_follow)
             following = True
             message = 'Followed successfully'
             
             # 创建关注通知
-            Notification.objects.create(
-                recipient=user_to_follow,
-                sender=request.user,
+            notifier.notify(
+                recipient_id=user_to_follow.id,
+                sender_id=request.user.id,
                 notification_type='follow',
                 title=f'{request.user.username} 关注了你',
                 message=f'{request.user.username} 开始关注你了！',
                 target_url=f'/users/profile/{request.user.id}/'
             )
         
-        # 更新用户资料中的关注者计数
-        followed_profile = user_to_follow.userprofile
-        followed_profile.save()
-        
         return JsonResponse({
             'success': True,
-            'following': not created,
+            'following': following,
             'message': message,
-            'follower_count': followed_profile.follower_count
+            'follower_count': _follower_count(user_to_follow)
         })
     
     return JsonResponse({'success': False, 'message': 'Invalid request'})
 
 
+NOTIFICATION_ORDERING = ('-updated_at', '-id')
+
+
+def _page_size(request):
+    default = getattr(settings, 'NOTIFICATION_PAGE_SIZE', 20)
+    try:
+        return max(1, min(int(request.GET.get('page_size', default)), 100))
+    except ValueError:
+        return default
+
+
+def _show_notifications(request):
+    """
+    取出一页通知，并只把这一页中未读的标记为已读；返回 (通知列表, 下一页游标)
+    """
+    items, next_cursor = paginate(
+        request.user.notifications.all(),
+        request.GET.get('cursor'),
+        _page_size(request),
+        NOTIFICATION_ORDERING,
+    )
+    unread_ids = [notification.id for notification in items if not notification.is_read]
+    if unread_ids:
+        marked = Notification.objects.filter(pk__in=unread_ids, is_read=False).update(is_read=True)
+        if marked:
+            decr_unread(request.user.id, marked)
+            push_unread(request.user.id)
+    return items, next_cursor
+
+
+def notification_to_dict(notification):
+    return {
+        'id': notification.id,
+        'notification_type': notification.notification_type,
+        'title': notification.title,
+        'message': notification.message,
+        'target_url': notification.target_url,
+        'actor_count': notification.actor_count,
+        'is_read': notification.is_read,
+        'updated_at': notification.updated_at.isoformat(),
+    }
+
+
 @login_required
 def notifications(request):
     """
-    用户通知列表页面
+    用户通知列表页面（游标分页，只标记当前页为已读）
     """
-    notifications = request.user.notifications.all()
-    
-    # 标记所有通知为已读
-    request.user.notifications.filter(is_read=False).update(is_read=True)
+    try:
+        notifications, next_cursor = _show_notifications(request)
+    except InvalidCursor:
+        return redirect('users:notifications')
     
     context = {
         'notifications': notifications,
+        'next_cursor': next_cursor,
     }
     return render(request, 'users/notifications.html', context)
 
 
+@require_safe
+@login_required
+def notifications_api(request):
+    """
+    通知JSON接口（游标分页，返回的未读通知标记为已读）
+    """
+    try:
+        notifications, next_cursor = _show_notifications(request)
+    except InvalidCursor:
+        return JsonResponse({'success': False, 'message': 'Invalid cursor'}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'notifications': [notification_to_dict(notification) for notification in notifications],
+        'next_cursor': next_cursor,
+    })
+
+
 @login_required
 def mark_notification_read(request, notification_id):
     """
     标记单个通知为已读
     """
-    try:
-        notification = request.user.notifications.get(id=notification_id, is_read=False)
-        notification.mark_as_read()
+    # 条件更新，并发重复请求只会减少一次计数
+    if request.user.notifications.filter(id=notification_id, is_read=False).update(is_read=True):
+        decr_unread(request.user.id)
+        push_unread(request.user.id)
         return JsonResponse({'success': True})
-    except Notification.DoesNotExist:
-        return JsonResponse({'success': False, 'message': 'Notification not found'})
+    return JsonResponse({'success': False, 'message': 'Notification not found'})
+
+
+def _unread_etag(request):
+    return f'{request.user.id}-{get_unread_count(request.user.id)}'
 
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_unread_etag)
 def unread_notifications_count(request):
     """
-    获取未读通知数量
+    获取未读通知数量（读取缓存计数，带 ETag，未变化时返回 304）
+    """
+    return JsonResponse({'count': get_unread_count(request.user.id)})
+
+
+@login_required
+async def notification_stream(request):
+    """
+    通知推送（SSE）：新通知和未读数变化时推送事件，需要以 ASGI 方式部署
+
+    未启用 NOTIFICATION_STREAM_ENABLED 时返回 404，避免 WSGI 工作线程被长连接占满
     """
-    count = request.user.notifications.filter(is_read=False).count()
-    return JsonResponse({'count': count})
\ No newline at end of file
+    if not getattr(settings, 'NOTIFICATION_STREAM_ENABLED', False):
+        raise Http404('通知推送未启用')
+    user = await request.auser()
+    response = StreamingHttpResponse(
+        event_stream(user.id, getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT', 15)),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # 禁止反向代理缓冲事件流
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class VideosConfig(AppConfig):
     name = 'videos'
+
+    def ready(self):
+        # 注册全文检索索引、相关视频索引、标签缓存、关注动态收件箱、UP主统计的同步信号
+        from . import creator_stats, feed, related, search, tagging  # noqa: F401
@@ -0,0 +1,40 @@
+"""
+UP主统计（UserProfile.total_videos/total_views/total_likes）随视频变化增量更新
+
+观看数在 view_buffer 落库时累加，点赞数在 Video.toggle_reaction 中累加；
+这里处理视频的发布、取消发布和删除。
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from users.models import UserProfile
+from .models import Video
+
+
+@receiver(pre_save, sender=Video)
+def remember_published(sender, instance, update_fields=None, **kwargs):
+    instance._was_published = None
+    if instance.pk is None or (update_fields is not None and 'published' not in update_fields):
+        return
+    instance._was_published = Video.objects.filter(pk=instance.pk).values_list('published', flat=True).first()
+
+
+@receiver(post_save, sender=Video)
+def count_published_video(sender, instance, created, **kwargs):
+    if created:
+        delta = int(instance.published)
+    elif getattr(instance, '_was_published', None) is not None:
+        delta = int(instance.published) - int(instance._was_published)
+    else:
+        return
+    UserProfile.add_stats(instance.uploader_id, total_videos=delta)
+
+
+@receiver(post_delete, sender=Video)
+def subtract_deleted_video(sender, instance, **kwargs):
+    UserProfile.add_stats(
+        instance.uploader_id,
+        total_videos=-int(instance.published),
+        total_views=-instance.view_count,
+        total_likes=-instance.like_count,
+    )
@@ -0,0 +1,155 @@
+"""
+关注动态（混合推拉）
+
+普通UP主发布视频时把 FeedEntry 写入每个关注者的收件箱（推）；粉丝数达到
+FEED_FANOUT_THRESHOLD 的UP主不写收件箱，读取时直接查询他们的视频（拉）。
+读取一页时两路各取 page_size + 1 条，按 (upload_date, id) 归并，
+耗时只与页大小和关注的大UP主数量有关，与关注总数无关。
+
+写收件箱由 run_media_worker 的 fanout 任务在后台完成，不占用上传请求。
+UP主当前的模式记录在 UserProfile.feed_pulled 中，关注/取消关注后检查是否跨过阈值；
+从拉模式回到推模式时，把最近 FEED_BACKFILL_LIMIT 个视频重新登记 fanout 任务，
+补上拉模式期间发布、收件箱中没有的视频。
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.models import UserFollow, UserProfile
+from .media import enqueue_jobs
+from .models import FeedEntry, Video
+from .pagination import encode_cursor, paginate
+
+FEED_ORDERING = ('-upload_date', '-video_id')
+VIDEO_ORDERING = ('-upload_date', '-id')
+
+
+def _threshold():
+    return getattr(settings, 'FEED_FANOUT_THRESHOLD', 10000)
+
+
+def _batch_size():
+    return getattr(settings, 'FEED_FANOUT_BATCH_SIZE', 1000)
+
+
+def uses_fanout(user_id):
+    """
+    UP主的新视频是否写入关注者收件箱
+    """
+    return not UserProfile.objects.filter(user_id=user_id, feed_pulled=True).exists()
+
+
+def update_feed_mode(user_id):
+    """
+    粉丝数跨过阈值时切换UP主的推/拉模式（条件 UPDATE，并发时只有一次生效）
+    """
+    threshold = _threshold()
+    UserProfile.objects.filter(user_id=user_id, feed_pulled=False, follower_count__gte=threshold).update(
+        feed_pulled=True
+    )
+    if UserProfile.objects.filter(user_id=user_id, feed_pulled=True, follower_count__lt=threshold).update(
+        feed_pulled=False
+    ):
+        limit = getattr(settings, 'FEED_BACKFILL_LIMIT', 50)
+        enqueue_jobs(
+            Video.objects.filter(uploader_id=user_id, published=True).order_by(*VIDEO_ORDERING)
+            .values_list('pk', flat=True)[:limit],
+            ['fanout'],
+        )
+
+
+def fan_out(video):
+    """
+    把视频写入UP主所有关注者的收件箱，返回写入的条数
+    """
+    follower_ids = UserFollow.objects.filter(followed_id=video.uploader_id).values_list('follower_id', flat=True)
+    written = 0
+    batch = []
+    for follower_id in follower_ids.iterator(chunk_size=_batch_size()):
+        batch.append(FeedEntry(user_id=follower_id, video_id=video.pk, upload_date=video.upload_date))
+        if len(batch) >= _batch_size():
+            written += len(FeedEntry.objects.bulk_create(batch, ignore_conflicts=True))
+            batch = []
+    if batch:
+        written += len(FeedEntry.objects.bulk_create(batch, ignore_conflicts=True))
+    return written
+
+
+def fill_inbox(user_id, uploader_id, limit=None):
+    """
+    把UP主最近的 limit 个视频写入用户的收件箱（关注后补齐、回填命令使用）
+    """
+    limit = limit or getattr(settings, 'FEED_BACKFILL_LIMIT', 50)
+    videos = Video.objects.filter(uploader_id=uploader_id, published=True).order_by(
+        *VIDEO_ORDERING
+    ).values_list('pk', 'upload_date')[:limit]
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(user_id=user_id, video_id=pk, upload_date=upload_date) for pk, upload_date in videos],
+        ignore_conflicts=True,
+    )
+
+
+def load_feed(user, cursor=None, page_size=20):
+    """
+    返回 (关注动态中的视频列表, 下一页游标)
+
+    游标由 (upload_date, 视频ID) 组成，收件箱和大UP主两路共用。
+    """
+    entries, inbox_cursor = paginate(
+        FeedEntry.objects.filter(user=user, video__published=True).select_related('video__uploader'),
+        cursor,
+        page_size,
+        FEED_ORDERING,
+    )
+    videos = {entry.video_id: entry.video for entry in entries}
+
+    pulled_ids = UserFollow.objects.filter(
+        follower=user, followed__userprofile__feed_pulled=True,
+    ).values_list('followed_id', flat=True)
+    pulled, pulled_cursor = paginate(
+        Video.objects.filter(uploader_id__in=list(pulled_ids), published=True).select_related('uploader'),
+        cursor,
+        page_size,
+        VIDEO_ORDERING,
+    )
+    # UP主切换到拉模式前写入的收件箱记录可能与拉取的结果重复
+    for video in pulled:
+        videos.setdefault(video.pk, video)
+
+    merged = sorted(videos.values(), key=lambda video: (video.upload_date, video.pk), reverse=True)
+    # 两路都已取完且合并后不超过一页时才是最后一页
+    if len(merged) <= page_size and inbox_cursor is None and pulled_cursor is None:
+        return merged, None
+    merged = merged[:page_size]
+    return merged, encode_cursor([merged[-1].upload_date, merged[-1].pk])
+
+
+@receiver(post_save, sender=Video)
+def fan_out_on_publish(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'published' not in update_fields:
+        return
+    if not instance.published:
+        # 取消发布的视频从收件箱移除
+        if not created:
+            FeedEntry.objects.filter(video=instance).delete()
+        return
+    if not uses_fanout(instance.uploader_id):
+        return
+    if created or not FeedEntry.objects.filter(video=instance).exists():
+        transaction.on_commit(lambda: enqueue_jobs([instance.pk], ['fanout']))
+
+
+@receiver(post_save, sender=UserFollow)
+def fill_inbox_on_follow(sender, instance, created, **kwargs):
+    if not created:
+        return
+    if uses_fanout(instance.followed_id):
+        transaction.on_commit(lambda: fill_inbox(instance.follower_id, instance.followed_id))
+    transaction.on_commit(lambda: update_feed_mode(instance.followed_id))
+
+
+@receiver(post_delete, sender=UserFollow)
+def clear_inbox_on_unfollow(sender, instance, **kwargs):
+    FeedEntry.objects.filter(user_id=instance.follower_id, video__uploader_id=instance.followed_id).delete()
+    transaction.on_commit(lambda: update_feed_mode(instance.followed_id))
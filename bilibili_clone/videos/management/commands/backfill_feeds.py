@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.models import UserFollow, UserProfile
+from videos.feed import fill_inbox
+
+
+class Command(BaseCommand):
+    help = '按现有关注关系回填关注动态收件箱（读取时合并的大UP主跳过）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='每批处理的关注关系数')
+        parser.add_argument(
+            '--limit', type=int, default=getattr(settings, 'FEED_BACKFILL_LIMIT', 50),
+            help='每个关注的UP主写入的最近视频数',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        total = skipped = 0
+        while True:
+            follows = list(
+                UserFollow.objects.filter(pk__gt=last_id).order_by('pk')
+                .values_list('pk', 'follower_id', 'followed_id')[:batch_size]
+            )
+            if not follows:
+                break
+            pulled = set(UserProfile.objects.filter(
+                user_id__in={followed_id for _, _, followed_id in follows},
+                feed_pulled=True,
+            ).values_list('user_id', flat=True))
+            for _, follower_id, followed_id in follows:
+                if followed_id in pulled:
+                    skipped += 1
+                else:
+                    fill_inbox(follower_id, followed_id, options['limit'])
+            total += len(follows)
+            last_id = follows[-1][0]
+            self.stdout.write(f'已处理 {total} 条关注关系')
+        self.stdout.write(self.style.SUCCESS(f'关注动态回填完成，共 {total} 条关注关系，跳过大UP主 {skipped} 条'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from videos.media import MEDIA_STAGES, STAGES
+from videos.models import MediaJob, Video
+
+
+class Command(BaseCommand):
+    help = '为已有视频登记媒体处理任务（已登记的任务不受影响）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stage', action='append', choices=list(STAGES), help='只登记指定阶段，可重复；默认为媒体处理阶段',
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='每批处理的视频数')
+
+    def handle(self, *args, **options):
+        stages = options['stage'] or list(MEDIA_STAGES)
+        batch_size = options['batch_size']
+        last_id = 0
+        total = 0
+        while True:
+            video_ids = list(
+                Video.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not video_ids:
+                break
+            MediaJob.objects.bulk_create(
+                [MediaJob(video_id=video_id, stage=stage) for video_id in video_ids for stage in stages],
+                ignore_conflicts=True,
+            )
+            total += len(video_ids)
+            last_id = video_ids[-1]
+            self.stdout.write(f'已处理 {total} 个视频')
+        self.stdout.write(self.style.SUCCESS(f'任务登记完成，共 {total} 个视频'))
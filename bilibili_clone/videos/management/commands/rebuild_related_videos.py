@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from videos.models import Video
+from videos.related import refresh_related
+
+
+class Command(BaseCommand):
+    help = '重新计算所有视频的相关视频索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='每批处理的视频数')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        total = 0
+        while True:
+            video_ids = list(
+                Video.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not video_ids:
+                break
+            for video_id in video_ids:
+                refresh_related(video_id)
+            total += len(video_ids)
+            last_id = video_ids[-1]
+            self.stdout.write(f'已处理 {total} 个视频')
+        self.stdout.write(self.style.SUCCESS(f'相关视频索引重建完成，共 {total} 个视频'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from videos.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = '重建视频全文检索索引（SQLite FTS5）'
+
+    def handle(self, *args, **options):
+        count = rebuild_index()
+        if count is None:
+            raise CommandError('全文检索索引不可用，请先运行 migrate（仅支持SQLite）')
+        self.stdout.write(self.style.SUCCESS(f'已重建索引，共 {count} 个视频'))
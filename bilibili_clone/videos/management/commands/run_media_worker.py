@@ -0,0 +1,101 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from videos import media
+
+
+class Command(BaseCommand):
+    help = '执行视频的后台任务（元数据解析、缩略图生成、关注动态推送）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help='子进程数量')
+        parser.add_argument('--batch-size', type=int, default=None, help='每轮领取的任务数，默认为子进程数的4倍')
+        parser.add_argument('--poll-interval', type=float, default=5, help='没有任务时的等待秒数')
+        parser.add_argument('--stale-timeout', type=int, default=600, help='处理中超过该秒数的任务视为中断，重新排队')
+        parser.add_argument('--once', action='store_true', help='处理完当前所有到期任务后退出')
+
+    def handle(self, *args, **options):
+        processes = max(options['processes'], 1)
+        batch_size = options['batch_size'] or processes * 4
+
+        recovered = media.recover_stale_jobs(options['stale_timeout'])
+        if recovered:
+            self.stdout.write(f'重新排队 {recovered} 个中断的任务')
+
+        executor = self.create_pool(processes)
+        try:
+            while True:
+                jobs = media.claim_jobs(batch_size)
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                if self.run_batch(executor, jobs):
+                    # 子进程异常退出（如内存不足被杀）后进程池不可再用，重建后继续
+                    self.stderr.write('子进程异常退出，重建进程池')
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    executor = self.create_pool(processes)
+        finally:
+            executor.shutdown()
+
+    def create_pool(self, processes):
+        # 数据库连接不能跨进程共享，创建进程池前先关闭
+        connections.close_all()
+        return ProcessPoolExecutor(max_workers=processes, initializer=django.setup)
+
+    def run_batch(self, executor, jobs):
+        """
+        执行一批任务，返回进程池是否已损坏
+        """
+        futures = {}
+        broken = False
+        for job in jobs:
+            stage = media.STAGES[job.stage]
+            payload = stage.payload(job.video)
+            if payload is None:
+                # 没有可处理的文件（例如未上传缩略图）
+                media.complete_job(job)
+                continue
+            if getattr(stage, 'in_process', False):
+                # 只访问数据库的阶段在主进程中执行
+                self.finish(job, lambda: stage.run(payload))
+                continue
+            if broken:
+                media.requeue_job(job)
+                continue
+            try:
+                futures[executor.submit(media.run_stage, job.stage, payload)] = job
+            except BrokenProcessPool:
+                media.requeue_job(job)
+                broken = True
+
+        for future in as_completed(futures):
+            job = futures[future]
+            if isinstance(future.exception(), BrokenProcessPool):
+                # 无法确定是哪个任务导致子进程退出，都按出错重试，反复导致退出的任务最终标记为失败
+                media.fail_job(job, 'Worker process terminated abruptly')
+                self.stderr.write(f'任务中断 视频{job.video_id} {job.stage}（第{job.attempts}次）')
+                broken = True
+                continue
+            self.finish(job, future.result)
+        self.stdout.write(f'已处理 {len(jobs)} 个任务')
+        return broken
+
+    def finish(self, job, get_result):
+        try:
+            media.STAGES[job.stage].apply(job.video, get_result())
+        except media.PermanentError as e:
+            media.fail_job(job, e, retry=False)
+            self.stderr.write(f'任务失败 视频{job.video_id} {job.stage}: {e}')
+        except Exception as e:
+            media.fail_job(job, e)
+            self.stderr.write(f'任务出错 视频{job.video_id} {job.stage}（第{job.attempts}次）: {e}')
+        else:
+            media.complete_job(job)
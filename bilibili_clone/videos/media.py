@@ -0,0 +1,267 @@
+"""
+后台媒体处理流水线
+
+上传完成后为视频登记 MediaJob（每个阶段一条），由 run_media_worker 命令
+在进程池中执行。每个阶段分三步：
+    payload(video)         在主进程中根据数据库准备输入（文件路径等）
+    run(payload)           在子进程中执行，只操作文件，不访问数据库
+    apply(video, result)   在主进程中把结果写回数据库
+
+阶段的输出是确定的（固定的文件名、覆盖写入），重复执行是安全的；
+失败的任务按指数退避重试，超过次数后标记为失败。
+只访问数据库的阶段（in_process = True，如关注动态推送、相关视频计算）直接在主进程中执行。
+"""
+import os
+from datetime import timedelta
+
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import mp4
+from .models import MediaJob, Video
+
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 30  # 秒，第N次重试等待 RETRY_DELAY * 2^(N-1)
+
+THUMBNAIL_VARIANTS = {
+    'small': (320, 180),
+    'medium': (640, 360),
+}
+THUMBNAIL_QUALITY = 80
+
+
+class PermanentError(Exception):
+    """
+    重试也不会成功的错误（文件格式不支持等）
+    """
+
+
+def _local_path(field_file):
+    return field_file.storage.path(field_file.name)
+
+
+class FaststartStage:
+    """
+    moov 位于文件末尾时改写为快速启动布局，播放器无需先读取文件尾部
+    """
+    name = 'faststart'
+
+    def payload(self, video):
+        if not video.video_file:
+            return None
+        return {'path': _local_path(video.video_file)}
+
+    @staticmethod
+    def run(payload):
+        try:
+            return {'rewritten': mp4.faststart(payload['path'])}
+        except mp4.Mp4Error as e:
+            raise PermanentError(str(e))
+
+    def apply(self, video, result):
+        Video.objects.filter(pk=video.pk).update(is_faststart=True)
+
+
+class ProbeStage:
+    """
+    解析容器头，填充时长、分辨率和视频编码
+    """
+    name = 'probe'
+
+    def payload(self, video):
+        if not video.video_file:
+            return None
+        return {'path': _local_path(video.video_file)}
+
+    @staticmethod
+    def run(payload):
+        try:
+            return mp4.probe(payload['path'])
+        except mp4.Mp4Error as e:
+            raise PermanentError(str(e))
+
+    def apply(self, video, result):
+        duration = result['duration']
+        Video.objects.filter(pk=video.pk).update(
+            duration=timedelta(seconds=duration) if duration is not None else None,
+            width=result['width'],
+            height=result['height'],
+            video_codec=result['video_codec'],
+        )
+
+
+class ThumbnailStage:
+    """
+    由用户上传的缩略图生成固定尺寸的压缩版本
+    """
+    name = 'thumbnails'
+
+    def payload(self, video):
+        if not video.thumbnail:
+            return None
+        storage = video.thumbnail.storage
+        variants = {}
+        for variant, size in THUMBNAIL_VARIANTS.items():
+            name = f'thumbnails/variants/{video.pk}_{variant}.jpg'
+            variants[variant] = (name, storage.path(name), size)
+        return {'source': _local_path(video.thumbnail), 'variants': variants}
+
+    @staticmethod
+    def run(payload):
+        try:
+            with Image.open(payload['source']) as image:
+                image = ImageOps.exif_transpose(image).convert('RGB')
+                result = {}
+                for variant, (name, path, size) in payload['variants'].items():
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    resized = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+                    # 先写临时文件再替换，避免读到写了一半的图片
+                    temp_path = path + '.tmp'
+                    resized.save(temp_path, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True, progressive=True)
+                    os.replace(temp_path, path)
+                    result[variant] = name
+                return result
+        except UnidentifiedImageError as e:
+            raise PermanentError(str(e))
+
+    def apply(self, video, result):
+        Video.objects.filter(pk=video.pk).update(
+            thumbnail_small=result.get('small'),
+            thumbnail_medium=result.get('medium'),
+        )
+
+
+class FanoutStage:
+    """
+    把新发布的视频写入UP主所有关注者的关注动态收件箱
+    """
+    name = 'fanout'
+    in_process = True
+
+    def payload(self, video):
+        # 推送前视频可能已取消发布，UP主也可能已切换为读取时合并
+        from .feed import uses_fanout  # feed 导入了本模块
+        if not video.published or not uses_fanout(video.uploader_id):
+            return None
+        return {}
+
+    @staticmethod
+    def run(payload):
+        return payload
+
+    def apply(self, video, result):
+        from .feed import fan_out
+        fan_out(video)
+
+
+class RelatedStage:
+    """
+    重新计算失效或过期的相关视频列表
+    """
+    name = 'related'
+    in_process = True
+
+    def payload(self, video):
+        return {}
+
+    @staticmethod
+    def run(payload):
+        return payload
+
+    def apply(self, video, result):
+        from .related import refresh_related  # related 导入了本模块
+        refresh_related(video.pk)
+
+
+STAGES = {
+    stage.name: stage
+    for stage in (FaststartStage(), ProbeStage(), ThumbnailStage(), FanoutStage(), RelatedStage())
+}
+
+# 上传后默认登记的媒体处理阶段
+MEDIA_STAGES = ('faststart', 'probe', 'thumbnails')
+
+
+def run_stage(stage_name, payload):
+    """
+    子进程入口
+    """
+    return STAGES[stage_name].run(payload)
+
+
+def enqueue_media_jobs(video, stages=None):
+    """
+    为视频登记媒体处理任务；已完成的任务重新置为等待处理
+    """
+    enqueue_jobs([video.pk], stages or MEDIA_STAGES)
+
+
+def enqueue_jobs(video_ids, stages):
+    """
+    为一批视频登记任务（两次查询），已完成的任务重新置为等待处理
+    """
+    video_ids = list(video_ids)
+    if not video_ids:
+        return
+    stages = list(stages)
+    MediaJob.objects.bulk_create(
+        [MediaJob(video_id=video_id, stage=stage) for video_id in video_ids for stage in stages],
+        ignore_conflicts=True,
+    )
+    MediaJob.objects.filter(video_id__in=video_ids, stage__in=stages).exclude(status='pending').update(
+        status='pending', attempts=0, last_error='', run_after=timezone.now(), updated_at=timezone.now()
+    )
+
+
+def claim_jobs(limit):
+    """
+    领取最多 limit 个到期的任务；用条件更新保证同一任务只被一个 worker 领取
+    """
+    now = timezone.now()
+    candidate_ids = list(
+        MediaJob.objects.filter(status='pending', run_after__lte=now)
+        .order_by('run_after', 'pk').values_list('pk', flat=True)[:limit]
+    )
+    claimed_ids = [
+        pk for pk in candidate_ids
+        if MediaJob.objects.filter(pk=pk, status='pending').update(
+            status='running', attempts=F('attempts') + 1, updated_at=now
+        )
+    ]
+    return list(MediaJob.objects.filter(pk__in=claimed_ids).select_related('video'))
+
+
+def complete_job(job):
+    MediaJob.objects.filter(pk=job.pk).update(status='done', last_error='', updated_at=timezone.now())
+
+
+def fail_job(job, error, retry=True):
+    now = timezone.now()
+    if retry and job.attempts < MAX_ATTEMPTS:
+        MediaJob.objects.filter(pk=job.pk).update(
+            status='pending',
+            last_error=str(error),
+            run_after=now + timedelta(seconds=RETRY_DELAY * 2 ** (job.attempts - 1)),
+            updated_at=now,
+        )
+    else:
+        MediaJob.objects.filter(pk=job.pk).update(status='failed', last_error=str(error), updated_at=now)
+
+
+def requeue_job(job):
+    """
+    把已领取但没有开始执行的任务放回队列，不计入尝试次数
+    """
+    MediaJob.objects.filter(pk=job.pk, status='running').update(
+        status='pending', attempts=F('attempts') - 1, updated_at=timezone.now()
+    )
+
+
+def recover_stale_jobs(timeout):
+    """
+    把长时间处于处理中的任务（worker 异常退出）放回队列
+    """
+    return MediaJob.objects.filter(
+        status='running', updated_at__lt=timezone.now() - timedelta(seconds=timeout)
+    ).update(status='pending', updated_at=timezone.now())
@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-18 12:00
+
+from django.db import migrations
+from django.db.models import Count, Q
+
+
+def backfill_reaction_counts(apps, schema_editor):
+    """
+    用 VideoReaction 重新计算 like_count/dislike_count
+    """
+    Video = apps.get_model('videos', 'Video')
+    counts = Video.objects.annotate(
+        likes_total=Count('video_reactions', filter=Q(video_reactions__reaction_type='like')),
+        dislikes_total=Count('video_reactions', filter=Q(video_reactions__reaction_type='dislike')),
+    ).values_list('pk', 'likes_total', 'dislikes_total')
+    for pk, likes_total, dislikes_total in counts.iterator():
+        Video.objects.filter(pk=pk).update(like_count=likes_total, dislike_count=dislikes_total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0002_video_comment_count_video_dislike_count_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_reaction_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.0 on 2026-10-18 12:00
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """
+    创建视频全文检索索引表并导入已有视频（仅SQLite）
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS videos_video_fts "
+        "USING fts5(title, description, uploader_name, tokenize='trigram')"
+    )
+    schema_editor.execute(
+        "INSERT INTO videos_video_fts (rowid, title, description, uploader_name) "
+        "SELECT v.id, v.title, v.description, u.username "
+        "FROM videos_video v JOIN auth_user u ON u.id = v.uploader_id"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS videos_video_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0003_backfill_reaction_counts'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 6.0 on 2026-10-18 12:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0007_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='thumbnail_medium',
+            field=models.ImageField(blank=True, null=True, upload_to='thumbnails/variants/'),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='thumbnail_small',
+            field=models.ImageField(blank=True, null=True, upload_to='thumbnails/variants/'),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='video_codec',
+            field=models.CharField(blank=True, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='MediaJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(choices=[('probe', '解析容器信息'), ('thumbnails', '生成缩略图')], max_length=20)),
+                ('status', models.CharField(choices=[('pending', '等待处理'), ('running', '处理中'), ('done', '已完成'), ('failed', '失败')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='media_jobs', to='videos.video')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='mediajob_status_idx')],
+                'unique_together': {('video', 'stage')},
+            },
+        ),
+    ]
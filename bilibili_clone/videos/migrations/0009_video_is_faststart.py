@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0008_media_pipeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='is_faststart',
+            field=models.BooleanField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='mediajob',
+            name='stage',
+            field=models.CharField(choices=[('faststart', '快速启动改写'), ('probe', '解析容器信息'), ('thumbnails', '生成缩略图')], max_length=20),
+        ),
+    ]
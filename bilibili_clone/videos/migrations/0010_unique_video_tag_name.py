@@ -0,0 +1,49 @@
+# Generated by Django 6.0 on 2026-10-18 12:00
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_tags(apps, schema_editor):
+    """
+    同名标签合并到ID最小的一个，关系指向保留的标签
+    """
+    VideoTag = apps.get_model('videos', 'VideoTag')
+    VideoTagRelation = apps.get_model('videos', 'VideoTagRelation')
+    duplicates = VideoTag.objects.values('name').annotate(
+        keep_id=Min('id'), total=Count('id')
+    ).filter(total__gt=1).values_list('name', 'keep_id')
+    for name, keep_id in duplicates.iterator():
+        duplicate_ids = list(VideoTag.objects.filter(name=name).exclude(pk=keep_id).values_list('pk', flat=True))
+        # 已经关联了保留标签的视频，直接删除重复的关系
+        VideoTagRelation.objects.filter(
+            tag_id__in=duplicate_ids,
+            video_id__in=VideoTagRelation.objects.filter(tag_id=keep_id).values('video_id'),
+        ).delete()
+        # 同一视频关联了多个重复标签时只保留一条
+        seen_videos = set()
+        for relation_id, video_id in VideoTagRelation.objects.filter(
+            tag_id__in=duplicate_ids
+        ).order_by('pk').values_list('pk', 'video_id'):
+            if video_id in seen_videos:
+                VideoTagRelation.objects.filter(pk=relation_id).delete()
+            else:
+                seen_videos.add(video_id)
+        VideoTagRelation.objects.filter(tag_id__in=duplicate_ids).update(tag_id=keep_id)
+        VideoTag.objects.filter(pk__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0009_video_is_faststart'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_tags, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='videotag',
+            name='name',
+            field=models.CharField(max_length=50, unique=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-18 12:00
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def mark_computed(apps, schema_editor):
+    """
+    已有相关视频列表的视频视为刚计算过
+    """
+    Video = apps.get_model('videos', 'Video')
+    RelatedVideo = apps.get_model('videos', 'RelatedVideo')
+    Video.objects.filter(pk__in=RelatedVideo.objects.values('video_id')).update(related_computed_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0011_feed_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='related_computed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_computed, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0012_video_related_computed_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mediajob',
+            name='stage',
+            field=models.CharField(choices=[('faststart', '快速启动改写'), ('probe', '解析容器信息'), ('thumbnails', '生成缩略图'), ('fanout', '关注动态推送')], max_length=20),
+        ),
+    ]
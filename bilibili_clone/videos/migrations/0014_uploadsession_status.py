@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+def mark_complete(apps, schema_editor):
+    """
+    已经创建了视频的会话标记为已完成
+    """
+    UploadSession = apps.get_model('videos', 'UploadSession')
+    UploadSession.objects.filter(video__isnull=False).update(status='complete')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0013_mediajob_fanout_stage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='status',
+            field=models.CharField(choices=[('uploading', '上传中'), ('finalizing', '正在完成'), ('complete', '已完成')], default='uploading', max_length=20),
+        ),
+        migrations.RunPython(mark_complete, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,13 @@
-from django.db import models
+import uuid
+
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.urls import reverse
 
+from users.models import UserProfile
+
 
 class Video(models.Model):
     title = models.CharField(max_length=200)
@@ -19,23 +25,83 @@ class Video(models.Model):
     like_count = models.PositiveIntegerField(default=0)  # 点赞数
     dislike_count = models.PositiveIntegerField(default=0)  # 点踩数
     comment_count = models.PositiveIntegerField(default=0)  # 评论数
+    width = models.PositiveIntegerField(null=True, blank=True)  # 视频宽度
+    height = models.PositiveIntegerField(null=True, blank=True)  # 视频高度
+    video_codec = models.CharField(max_length=16, blank=True)  # 视频编码
+    thumbnail_small = models.ImageField(upload_to='thumbnails/variants/', blank=True, null=True)  # 小缩略图
+    thumbnail_medium = models.ImageField(upload_to='thumbnails/variants/', blank=True, null=True)  # 中缩略图
+    is_faststart = models.BooleanField(null=True, blank=True)  # moov 是否在文件开头，None 表示尚未检查
+    related_computed_at = models.DateTimeField(null=True, blank=True)  # 相关视频列表的计算时间，None 表示需要重新计算
     
     class Meta:
         ordering = ['-upload_date']
+        indexes = [
+            # 游标分页：按 (upload_date, id) 定位
+            models.Index(fields=['published', 'upload_date', 'id'], name='video_published_date_idx'),
+            models.Index(fields=['uploader', 'published', 'upload_date', 'id'], name='video_uploader_date_idx'),
+        ]
     
     def __str__(self):
         return self.title
     
     def get_absolute_url(self):
-        return reverse('video_detail', kwargs={'pk': self.pk})
+        return reverse('videos:video_detail', kwargs={'pk': self.pk})
     
+    @property
+    def card_thumbnail(self):
+        """
+        列表卡片使用的缩略图，小尺寸版本尚未生成时使用原图
+        """
+        return self.thumbnail_small or self.thumbnail
+
+    @property
+    def poster(self):
+        return self.thumbnail_medium or self.thumbnail
+
     @property
     def total_likes(self):
-        return self.video_reactions.filter(reaction_type='like').count()
+        return self.like_count
     
     @property
     def total_dislikes(self):
-        return self.video_reactions.filter(reaction_type='dislike').count()
+        return self.dislike_count
+    
+    def toggle_reaction(self, user, reaction_type):
+        """
+        切换用户对视频的点赞/点踩，并在同一事务中更新 like_count/dislike_count
+        以及上传者的 total_likes
+
+        返回 (原有反应类型, 当前反应类型)，没有反应时为 None
+        """
+        with transaction.atomic():
+            existing_reaction = VideoReaction.objects.filter(video=self, user=user).first()
+            previous = existing_reaction.reaction_type if existing_reaction else None
+            
+            if existing_reaction is None:
+                VideoReaction.objects.create(video=self, user=user, reaction_type=reaction_type)
+                current = reaction_type
+            elif previous == reaction_type:
+                # 相同的反应类型，则取消
+                existing_reaction.delete()
+                current = None
+            else:
+                # 不同的反应类型，则更新
+                existing_reaction.reaction_type = reaction_type
+                existing_reaction.save(update_fields=['reaction_type'])
+                current = reaction_type
+            
+            like_delta = (current == 'like') - (previous == 'like')
+            dislike_delta = (current == 'dislike') - (previous == 'dislike')
+            Video.objects.filter(pk=self.pk).update(
+                like_count=F('like_count') + like_delta,
+                dislike_count=F('dislike_count') + dislike_delta,
+            )
+            UserProfile.add_stats(self.uploader_id, total_likes=like_delta)
+        
+        # 同步内存中的计数，调用方无需再查询
+        self.like_count += like_delta
+        self.dislike_count += dislike_delta
+        return previous, current
 
 
 class VideoCategory(models.Model):
@@ -47,7 +113,7 @@ class VideoCategory(models.Model):
 
 
 class VideoTag(models.Model):
-    name = models.CharField(max_length=50)
+    name = models.CharField(max_length=50, unique=True)
     
     def __str__(self):
         return self.name
@@ -70,6 +136,20 @@ class VideoTagRelation(models.Model):
         unique_together = ('video', 'tag')
 
 
+class RelatedVideo(models.Model):
+    """
+    相关视频索引：每个视频预先计算好的前K个相关视频
+    """
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='related_from')
+    rank = models.PositiveSmallIntegerField()  # 排名，从0开始
+    score = models.FloatField(default=0)  # 相似度得分，0表示热门视频补位
+    
+    class Meta:
+        unique_together = ('video', 'rank')
+        ordering = ['rank']
+
+
 class VideoReaction(models.Model):
     """
     视频点赞/点踩模型
@@ -129,3 +209,119 @@ class PlaylistItem(models.Model):
     class Meta:
         unique_together = ('playlist', 'position')
         ordering = ['position']
+
+
+
+class UploadSession(models.Model):
+    """
+    分块上传会话模型
+    """
+    STATUS_CHOICES = [
+        ('uploading', '上传中'),
+        ('finalizing', '正在完成'),
+        ('complete', '已完成'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    title = models.CharField(max_length=200)
+    description = models.TextField(blank=True)
+    file_name = models.CharField(max_length=255)  # 文件在存储中的最终路径
+    total_size = models.PositiveBigIntegerField()
+    received_ranges = models.JSONField(default=list)  # 已接收的区间 [[start, end), ...]
+    checksum = models.PositiveBigIntegerField(default=0)  # 已校验前缀的CRC32
+    checksum_offset = models.PositiveBigIntegerField(default=0)  # 已校验前缀的长度
+    video = models.OneToOneField(Video, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_session')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f'{self.owner.username}: {self.file_name}'
+    
+    @property
+    def received_size(self):
+        return sum(end - start for start, end in self.received_ranges)
+    
+    @property
+    def is_complete(self):
+        return self.received_ranges == [[0, self.total_size]]
+    
+    def add_range(self, start, end):
+        """
+        记录已接收的区间 [start, end)，与相邻或重叠的区间合并
+        """
+        merged = []
+        for range_start, range_end in sorted(self.received_ranges + [[start, end]]):
+            if merged and range_start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], range_end)
+            else:
+                merged.append([range_start, range_end])
+        self.received_ranges = merged
+    
+    def missing_ranges(self):
+        missing = []
+        offset = 0
+        for start, end in self.received_ranges:
+            if start > offset:
+                missing.append([offset, start])
+            offset = end
+        if offset < self.total_size:
+            missing.append([offset, self.total_size])
+        return missing
+
+
+class MediaJob(models.Model):
+    """
+    媒体处理任务模型（每个视频每个阶段一条）
+    """
+    STAGE_CHOICES = [
+        ('faststart', '快速启动改写'),
+        ('probe', '解析容器信息'),
+        ('thumbnails', '生成缩略图'),
+        ('fanout', '关注动态推送'),
+        ('related', '相关视频计算'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', '等待处理'),
+        ('running', '处理中'),
+        ('done', '已完成'),
+        ('failed', '失败'),
+    ]
+    
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='media_jobs')
+    stage = models.CharField(max_length=20, choices=STAGE_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    run_after = models.DateTimeField(default=timezone.now)  # 重试时间
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('video', 'stage')
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='mediajob_status_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.video_id}:{self.stage} ({self.status})'
+
+
+class FeedEntry(models.Model):
+    """
+    关注动态收件箱：普通UP主发布视频时写入每个关注者的收件箱；
+    粉丝数超过 FEED_FANOUT_THRESHOLD 的UP主不写入，读取时合并
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feed_entries')
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='feed_entries')
+    upload_date = models.DateTimeField()  # 冗余视频的上传时间，用于排序
+    
+    class Meta:
+        unique_together = ('user', 'video')
+        indexes = [
+            models.Index(fields=['user', '-upload_date', '-video'], name='feed_inbox_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.user_id} <- {self.video_id}'
@@ -0,0 +1,293 @@
+"""
+MP4/MOV 容器解析（纯Python）
+
+只读取 box 头和 moov 中需要的少量字段，不把媒体数据读入内存。
+本模块不依赖 Django，可以在媒体处理子进程中直接使用。
+"""
+import bisect
+import os
+import struct
+
+
+class Mp4Error(ValueError):
+    pass
+
+
+def iter_boxes(f, start, end):
+    """
+    遍历 [start, end) 范围内的 box，产出 (类型, 起始偏移, 头部长度, 总长度)
+    """
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        header = f.read(8)
+        if len(header) < 8:
+            break
+        size, box_type = struct.unpack('>I4s', header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            # 延伸到文件（或父 box）末尾
+            size = end - offset
+        if size < header_size or offset + size > end:
+            raise Mp4Error(f'Invalid box size at offset {offset}')
+        yield box_type.decode('latin-1'), offset, header_size, size
+        offset += size
+
+
+def find_box(f, start, end, box_type):
+    for found_type, offset, header_size, size in iter_boxes(f, start, end):
+        if found_type == box_type:
+            return offset, header_size, size
+    return None
+
+
+def _read_body(f, offset, header_size, size, length=None):
+    f.seek(offset + header_size)
+    return f.read(size - header_size if length is None else min(length, size - header_size))
+
+
+def _file_size(f):
+    f.seek(0, 2)
+    return f.tell()
+
+
+def _parse_mvhd(body):
+    version = body[0]
+    if version == 1:
+        timescale, duration = struct.unpack('>IQ', body[20:32])
+    else:
+        timescale, duration = struct.unpack('>II', body[12:20])
+    return timescale, duration
+
+
+def _parse_tkhd_size(body):
+    version = body[0]
+    position = 88 if version == 1 else 76
+    width, height = struct.unpack('>II', body[position:position + 8])
+    # 16.16 定点数
+    return width >> 16, height >> 16
+
+
+def _parse_track(f, offset, header_size, size):
+    track = {}
+    tkhd = find_box(f, offset + header_size, offset + size, 'tkhd')
+    if tkhd:
+        track['width'], track['height'] = _parse_tkhd_size(_read_body(f, *tkhd, length=96))
+
+    mdia = find_box(f, offset + header_size, offset + size, 'mdia')
+    if not mdia:
+        return track
+    mdia_start, mdia_end = mdia[0] + mdia[1], mdia[0] + mdia[2]
+    hdlr = find_box(f, mdia_start, mdia_end, 'hdlr')
+    if hdlr:
+        track['handler'] = _read_body(f, *hdlr, length=12)[8:12].decode('latin-1')
+
+    minf = find_box(f, mdia_start, mdia_end, 'minf')
+    stbl = minf and find_box(f, minf[0] + minf[1], minf[0] + minf[2], 'stbl')
+    stsd = stbl and find_box(f, stbl[0] + stbl[1], stbl[0] + stbl[2], 'stsd')
+    if stsd:
+        body = _read_body(f, *stsd, length=16)
+        if len(body) >= 16:
+            track['codec'] = body[12:16].decode('latin-1').strip()
+    return track
+
+
+def probe(path):
+    """
+    解析文件的时长、分辨率和视频编码，返回
+    {'duration': 秒, 'width': 宽, 'height': 高, 'video_codec': 编码}
+    """
+    with open(path, 'rb') as f:
+        file_size = _file_size(f)
+        moov = find_box(f, 0, file_size, 'moov')
+        if not moov:
+            raise Mp4Error('No moov box found')
+        moov_start, moov_end = moov[0] + moov[1], moov[0] + moov[2]
+
+        info = {'duration': None, 'width': None, 'height': None, 'video_codec': ''}
+        mvhd = find_box(f, moov_start, moov_end, 'mvhd')
+        if mvhd:
+            timescale, duration = _parse_mvhd(_read_body(f, *mvhd, length=32))
+            if timescale:
+                info['duration'] = duration / timescale
+
+        for box_type, offset, header_size, size in iter_boxes(f, moov_start, moov_end):
+            if box_type != 'trak':
+                continue
+            track = _parse_track(f, offset, header_size, size)
+            if track.get('handler') == 'vide':
+                info['width'] = track.get('width')
+                info['height'] = track.get('height')
+                info['video_codec'] = track.get('codec', '')
+                break
+        return info
+
+
+# 快速启动改写时需要展开的容器，其余 box 原样保留
+CONTAINER_BOXES = {'moov', 'trak', 'mdia', 'minf', 'stbl'}
+
+COPY_BLOCK_SIZE = 1024 * 1024
+
+# stco 只能保存32位偏移
+MAX_STCO_OFFSET = 0xFFFFFFFF
+
+
+def _parse_tree(data, box_type):
+    """
+    把 moov 解析成 [类型, 子节点列表] / [类型, 原始字节] / [类型, 块偏移表]
+    """
+    if box_type in ('stco', 'co64'):
+        count = struct.unpack('>I', data[4:8])[0]
+        item = '>I' if box_type == 'stco' else '>Q'
+        item_size = struct.calcsize(item)
+        if 8 + count * item_size > len(data):
+            raise Mp4Error(f'Truncated {box_type} box')
+        offsets = [struct.unpack_from(item, data, 8 + i * item_size)[0] for i in range(count)]
+        return [box_type, {'header': data[:4], 'offsets': offsets}]
+    if box_type not in CONTAINER_BOXES:
+        return [box_type, data]
+
+    children = []
+    offset = 0
+    while offset + 8 <= len(data):
+        size, child_type = struct.unpack_from('>I4s', data, offset)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = len(data) - offset
+        if size < header_size or offset + size > len(data):
+            raise Mp4Error(f'Invalid box size in {box_type}')
+        child_type = child_type.decode('latin-1')
+        children.append(_parse_tree(data[offset + header_size:offset + size], child_type))
+        offset += size
+    return [box_type, children]
+
+
+def _serialize_tree(node):
+    box_type, content = node
+    if isinstance(content, list):
+        body = b''.join(_serialize_tree(child) for child in content)
+    elif isinstance(content, dict):
+        offsets = content['offsets']
+        item = '>I' if box_type == 'stco' else '>Q'
+        body = content['header'] + struct.pack('>I', len(offsets)) + b''.join(
+            struct.pack(item, offset) for offset in offsets
+        )
+    else:
+        body = content
+    if len(body) + 8 > 0xFFFFFFFF:
+        return struct.pack('>I4sQ', 1, box_type.encode('latin-1'), len(body) + 16) + body
+    return struct.pack('>I4s', len(body) + 8, box_type.encode('latin-1')) + body
+
+
+def _chunk_offset_boxes(node):
+    box_type, content = node
+    if box_type in ('stco', 'co64'):
+        yield node
+    elif isinstance(content, list):
+        for child in content:
+            yield from _chunk_offset_boxes(child)
+
+
+def _top_level_boxes(f):
+    return [
+        (box_type, offset, size)
+        for box_type, offset, header_size, size in iter_boxes(f, 0, _file_size(f))
+    ]
+
+
+def _copy_range(src, dst, offset, length):
+    src.seek(offset)
+    while length > 0:
+        data = src.read(min(COPY_BLOCK_SIZE, length))
+        if not data:
+            raise Mp4Error('Unexpected end of file')
+        dst.write(data)
+        length -= len(data)
+
+
+def faststart(path):
+    """
+    把 moov 移到第一个 mdat 之前，并修正 stco/co64 中的块偏移
+
+    媒体数据按块流式复制到同目录下的临时文件，完成后原子替换原文件。
+    已经是快速启动布局时不做任何修改。返回是否改写了文件。
+    """
+    with open(path, 'rb') as src:
+        boxes = _top_level_boxes(src)
+        types = [box_type for box_type, _, _ in boxes]
+        if 'moov' not in types:
+            raise Mp4Error('No moov box found')
+        if 'mdat' not in types or types.index('moov') < types.index('mdat'):
+            return False
+
+        moov_index = types.index('moov')
+        mdat_index = types.index('mdat')
+        _, moov_offset, moov_size = boxes[moov_index]
+        header = find_box(src, moov_offset, moov_offset + moov_size, 'moov')
+        moov = _parse_tree(_read_body(src, *header), 'moov')
+        chunk_boxes = list(_chunk_offset_boxes(moov))
+
+        # 新布局：mdat 之前的 box、moov、其余 box（原顺序）
+        layout = boxes[:mdat_index] + [boxes[moov_index]] + [
+            box for index, box in enumerate(boxes) if index >= mdat_index and index != moov_index
+        ]
+
+        while True:
+            new_moov = _serialize_tree(moov)
+            # 计算每个原始 box 移动后的位置
+            starts, ends, deltas = [], [], []
+            position = 0
+            for box_type, offset, size in layout:
+                if box_type == 'moov':
+                    size = len(new_moov)
+                else:
+                    starts.append(offset)
+                    ends.append(offset + size)
+                    deltas.append(position - offset)
+                position += size
+            order = sorted(range(len(starts)), key=starts.__getitem__)
+            starts = [starts[i] for i in order]
+            ends = [ends[i] for i in order]
+            deltas = [deltas[i] for i in order]
+
+            def shift(offset):
+                index = bisect.bisect_right(starts, offset) - 1
+                if index < 0 or offset >= ends[index]:
+                    raise Mp4Error(f'Chunk offset {offset} is outside the media data')
+                return offset + deltas[index]
+
+            patched = [[shift(offset) for offset in node[1]['offsets']] for node in chunk_boxes]
+            overflow = [
+                node for node, offsets in zip(chunk_boxes, patched)
+                if node[0] == 'stco' and offsets and max(offsets) > MAX_STCO_OFFSET
+            ]
+            if not overflow:
+                break
+            # 32位偏移放不下，升级为 co64 后 moov 变大，需要重新计算
+            for node in overflow:
+                node[0] = 'co64'
+
+        for node, offsets in zip(chunk_boxes, patched):
+            node[1]['offsets'] = offsets
+        new_moov = _serialize_tree(moov)
+
+        temp_path = f'{path}.faststart'
+        try:
+            with open(temp_path, 'wb') as dst:
+                for box_type, offset, size in layout:
+                    if box_type == 'moov':
+                        dst.write(new_moov)
+                    else:
+                        _copy_range(src, dst, offset, size)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    return True
@@ -0,0 +1,102 @@
+"""
+游标（keyset）分页
+
+按排序字段的取值定位下一页，而不是 OFFSET，深层翻页与第一页代价相同。
+游标是排序字段取值的 base64 编码，对客户端不透明。
+"""
+import base64
+import json
+from datetime import datetime
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    payload = json.dumps(
+        [value.isoformat() if isinstance(value, datetime) else value for value in values],
+        separators=(',', ':'),
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list):
+        raise InvalidCursor(cursor)
+    return values
+
+
+def _field(queryset, name):
+    annotation = queryset.query.annotations.get(name)
+    if annotation is not None:
+        return annotation.output_field
+    try:
+        return queryset.model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+def _convert(queryset, ordering, values, cursor):
+    """
+    按排序字段的类型校验并转换游标中的取值，伪造或用在其他列表上的游标抛出 InvalidCursor
+    """
+    if len(values) != len(ordering):
+        raise InvalidCursor(cursor)
+    converted = []
+    for field, value in zip(ordering, values):
+        model_field = _field(queryset, field.lstrip('-'))
+        if value is None or isinstance(value, (list, dict)) or model_field is None:
+            raise InvalidCursor(cursor)
+        try:
+            value = model_field.to_python(value)
+        except (ValidationError, ValueError, TypeError):
+            raise InvalidCursor(cursor)
+        if value is None:
+            raise InvalidCursor(cursor)
+        converted.append(value)
+    return converted
+
+
+def _after(ordering, values):
+    """
+    构造“排在游标之后”的过滤条件：
+    (a > x) OR (a = x AND b > y) OR ...
+    """
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    return condition
+
+
+def paginate(queryset, cursor=None, page_size=20, ordering=('-upload_date', '-id')):
+    """
+    返回 (当前页对象列表, 下一页游标)；没有下一页时游标为 None
+
+    ordering 的最后一个字段必须唯一（通常是 id），保证顺序稳定。
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        values = _convert(queryset, ordering, decode_cursor(cursor), cursor)
+        queryset = queryset.filter(_after(ordering, values))
+
+    items = list(queryset[:page_size + 1])
+    if len(items) <= page_size:
+        return items, None
+
+    items = items[:page_size]
+    last = items[-1]
+    next_cursor = encode_cursor([getattr(last, field.lstrip('-')) for field in ordering])
+    return items, next_cursor
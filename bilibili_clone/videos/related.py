@@ -0,0 +1,173 @@
+"""
+相关视频索引
+
+每个视频的相关视频按共同分类、共同标签打分，取前K个写入 RelatedVideo，
+不足K个时用热门视频补位。video_detail 只需一次带索引的查询即可读取。
+
+分类/标签关系变化时重新计算该视频的列表，并让引用它的视频以及它的新邻居
+的列表失效。视频取消发布或删除时，引用它的列表同样失效。
+
+Video.related_computed_at 记录列表的计算时间，列表为空（没有其他已发布视频）
+也算已计算。失效的列表保留原有记录，由 run_media_worker 的 related 任务在后台
+重新计算；video_detail 只读取，不在页面请求中写库：列表失效或超过
+RELATED_VIDEOS_TTL 时继续提供旧列表（没有时用热门视频），并在没有待处理任务时
+登记一个。
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .media import enqueue_jobs
+from .models import MediaJob, RelatedVideo, Video, VideoCategoryRelation, VideoTagRelation
+
+CATEGORY_WEIGHT = 2.0
+TAG_WEIGHT = 1.0
+
+# 每种关系最多取多少个候选视频（新视频优先）
+CANDIDATE_LIMIT = 500
+
+
+def related_count():
+    return getattr(settings, 'RELATED_VIDEOS_COUNT', 6)
+
+
+def compute_related(video_id, k=None):
+    """
+    计算视频的前K个相关视频，返回 [(视频ID, 得分), ...]
+    """
+    if k is None:
+        k = related_count()
+
+    scores = Counter()
+    category_ids = VideoCategoryRelation.objects.filter(video_id=video_id).values('category_id')
+    for candidate_id in VideoCategoryRelation.objects.filter(
+        category_id__in=category_ids
+    ).exclude(video_id=video_id).order_by('-video_id').values_list('video_id', flat=True)[:CANDIDATE_LIMIT]:
+        scores[candidate_id] += CATEGORY_WEIGHT
+
+    tag_ids = VideoTagRelation.objects.filter(video_id=video_id).values('tag_id')
+    for candidate_id in VideoTagRelation.objects.filter(
+        tag_id__in=tag_ids
+    ).exclude(video_id=video_id).order_by('-video_id').values_list('video_id', flat=True)[:CANDIDATE_LIMIT]:
+        scores[candidate_id] += TAG_WEIGHT
+
+    # 同分时按观看次数排序，并排除未发布的视频
+    popularity = dict(
+        Video.objects.filter(pk__in=list(scores), published=True).values_list('pk', 'view_count')
+    ) if scores else {}
+    ranked = sorted(popularity, key=lambda pk: (-scores[pk], -popularity[pk], -pk))[:k]
+    result = [(pk, scores[pk]) for pk in ranked]
+
+    # 相关视频不够，添加热门视频
+    if len(result) < k:
+        fallback = Video.objects.filter(published=True).exclude(
+            pk__in=ranked + [video_id]
+        ).order_by('-view_count').values_list('pk', flat=True)[:k - len(result)]
+        result.extend((pk, 0.0) for pk in fallback)
+    return result
+
+
+def refresh_related(video_id):
+    """
+    重新计算并保存视频的相关视频列表，返回相关视频ID列表
+    """
+    result = compute_related(video_id)
+    with transaction.atomic():
+        RelatedVideo.objects.filter(video_id=video_id).delete()
+        RelatedVideo.objects.bulk_create([
+            RelatedVideo(video_id=video_id, related_id=related_id, rank=rank, score=score)
+            for rank, (related_id, score) in enumerate(result)
+        ])
+        Video.objects.filter(pk=video_id).update(related_computed_at=timezone.now())
+    return [related_id for related_id, _ in result]
+
+
+def invalidate_related(video_ids):
+    """
+    标记视频的相关视频列表失效，登记后台重新计算；重新计算前继续使用旧列表
+    """
+    video_ids = list(video_ids)
+    with transaction.atomic():
+        Video.objects.filter(pk__in=video_ids).update(related_computed_at=None)
+        enqueue_jobs(video_ids, ['related'])
+
+
+def _needs_refresh(video):
+    if video.related_computed_at is None:
+        return True
+    ttl = getattr(settings, 'RELATED_VIDEOS_TTL', 24 * 60 * 60)
+    return video.related_computed_at < timezone.now() - timedelta(seconds=ttl)
+
+
+def relations_changed(video_id):
+    """
+    视频的分类/标签发生变化后调用
+    """
+    related_ids = refresh_related(video_id)
+    # 曾因相似度引用该视频的列表（热门补位不算）
+    referencing_ids = RelatedVideo.objects.filter(
+        related_id=video_id, score__gt=0
+    ).values_list('video_id', flat=True)
+    stale_ids = (set(referencing_ids) | set(related_ids)) - {video_id}
+    if stale_ids:
+        invalidate_related(stale_ids)
+
+
+def get_related_videos(video):
+    """
+    读取视频的相关视频；列表失效或过期时登记后台重新计算，本次仍返回旧列表，
+    还没有列表时返回热门视频
+    """
+    if _needs_refresh(video) and not MediaJob.objects.filter(
+        video=video, stage='related', status__in=['pending', 'running']
+    ).exists():
+        enqueue_jobs([video.pk], ['related'])
+    related = list(
+        Video.objects.filter(related_from__video=video, published=True)
+        .select_related('uploader').order_by('related_from__rank')
+    )
+    if not related and video.related_computed_at is None:
+        related = list(
+            Video.objects.filter(published=True).exclude(pk=video.pk)
+            .select_related('uploader').order_by('-view_count')[:related_count()]
+        )
+    return related
+
+
+@receiver(post_save, sender=VideoCategoryRelation)
+@receiver(post_delete, sender=VideoCategoryRelation)
+@receiver(post_save, sender=VideoTagRelation)
+@receiver(post_delete, sender=VideoTagRelation)
+def update_related_on_relation_change(sender, instance, **kwargs):
+    video_id = instance.video_id
+
+    def refresh():
+        # 视频本身被删除（级联删除关系）时不需要重新计算
+        if Video.objects.filter(pk=video_id).exists():
+            relations_changed(video_id)
+
+    transaction.on_commit(refresh)
+
+
+def _invalidate_referencing(video_id):
+    # 包括热门补位的引用，否则这些列表会一直少一个视频
+    referencing_ids = list(RelatedVideo.objects.filter(related_id=video_id).values_list('video_id', flat=True))
+    if referencing_ids:
+        invalidate_related(referencing_ids)
+
+
+@receiver(post_save, sender=Video)
+def invalidate_related_on_unpublish(sender, instance, created, update_fields=None, **kwargs):
+    if created or instance.published or (update_fields is not None and 'published' not in update_fields):
+        return
+    _invalidate_referencing(instance.pk)
+
+
+@receiver(pre_delete, sender=Video)
+def invalidate_related_on_video_delete(sender, instance, **kwargs):
+    _invalidate_referencing(instance.pk)
@@ -0,0 +1,137 @@
+"""
+视频全文检索（SQLite FTS5）
+
+索引表 videos_video_fts 以视频ID为 rowid，收录标题、描述和上传者用户名。
+使用 trigram 分词器，语义与原来的 icontains 子串匹配一致，同时支持中文。
+检索时索引表与视频表在同一条SQL中连接，发布状态、分类等过滤条件和分页
+都在数据库中完成，结果数不设上限。
+索引不可用（非SQLite、未建表或查询词过短）时返回 None，由调用方回退到ORM查询。
+"""
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Video
+
+FTS_TABLE = 'videos_video_fts'
+
+# trigram 分词器至少需要3个字符才能匹配
+MIN_QUERY_LENGTH = 3
+
+# 列权重：标题 > 上传者 > 描述
+RANK_WEIGHTS = (10.0, 1.0, 5.0)
+
+INDEXED_FIELDS = {'title', 'description', 'uploader'}
+
+_available = None
+
+
+def index_available():
+    """
+    检查索引表是否存在，结果在进程内缓存
+    """
+    global _available
+    if _available is None:
+        _available = (
+            connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _available
+
+
+def reset_availability():
+    global _available
+    _available = None
+
+
+def index_video(video):
+    """
+    写入或更新单个视频的索引
+    """
+    if not index_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [video.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description, uploader_name) VALUES (%s, %s, %s, %s)",
+            [video.pk, video.title, video.description, video.uploader.username],
+        )
+
+
+def remove_video(video_id):
+    if not index_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [video_id])
+
+
+def rebuild_index():
+    """
+    清空并重建索引，返回收录的视频数
+    """
+    reset_availability()
+    if not index_available():
+        return None
+    video_table = Video._meta.db_table
+    user_table = User._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description, uploader_name) "
+            f"SELECT v.id, v.title, v.description, u.username "
+            f"FROM {video_table} v JOIN {user_table} u ON u.id = v.uploader_id"
+        )
+        count = cursor.rowcount
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    return count
+
+
+def search_videos(queryset, query):
+    """
+    在视频查询集上加入全文检索条件，并以 search_rank（bm25，越小越相关）注解；
+    索引不可用时返回 None
+    """
+    query = query.strip()
+    if len(query) < MIN_QUERY_LENGTH or not index_available():
+        return None
+
+    # 整个查询作为一个短语，与 icontains 的子串语义一致
+    phrase = '"%s"' % query.replace('"', '""')
+    weights = ', '.join(str(weight) for weight in RANK_WEIGHTS)
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = {Video._meta.db_table}.id', f'{FTS_TABLE} MATCH %s'],
+        params=[phrase],
+    ).annotate(search_rank=RawSQL(f'bm25({FTS_TABLE}, {weights})', [], output_field=FloatField()))
+
+
+@receiver(post_save, sender=Video)
+def update_video_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not INDEXED_FIELDS.intersection(update_fields):
+        return
+    index_video(instance)
+
+
+@receiver(post_delete, sender=Video)
+def delete_video_index(sender, instance, **kwargs):
+    remove_video(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def update_uploader_name(sender, instance, created, update_fields=None, **kwargs):
+    # 用户改名后同步其视频索引中的上传者用户名；登录只更新 last_login，跳过
+    if created or (update_fields is not None and 'username' not in update_fields):
+        return
+    if not index_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {FTS_TABLE} SET uploader_name = %s "
+            f"WHERE rowid IN (SELECT id FROM {Video._meta.db_table} WHERE uploader_id = %s) "
+            f"AND uploader_name != %s",
+            [instance.username, instance.pk, instance.username],
+        )
@@ -0,0 +1,202 @@
+"""
+视频文件流式传输
+
+支持 Range（单区间/多区间）、If-None-Match/If-Modified-Since/If-Range 条件请求。
+单区间和完整文件通过 FileResponse 返回，WSGI 服务器可以用 sendfile 零拷贝发送；
+多区间返回 multipart/byteranges。
+"""
+import mimetypes
+import secrets
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+BLOCK_SIZE = 64 * 1024
+
+# 超过该数量的区间请求直接返回完整文件，防止滥用
+MAX_RANGES = 16
+
+
+class FileRange:
+    """
+    只暴露文件 [start, start + length) 区间的只读文件对象
+
+    保留 fileno()，并预先把文件位置移动到 start，
+    服务器据此配合 Content-Length 调用 sendfile。
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range_header(header, size):
+    """
+    解析 Range 头，返回 [(start, end), ...]（闭区间）
+
+    语法错误返回 None（忽略 Range，返回完整文件）；
+    所有区间都无法满足时返回空列表（416）。
+    """
+    unit, _, ranges_spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not ranges_spec:
+        return None
+
+    ranges = []
+    for spec in ranges_spec.split(','):
+        start, sep, end = spec.strip().partition('-')
+        if not sep:
+            return None
+        try:
+            if start:
+                start = int(start)
+                end = int(end) if end else None
+                if end is not None and start > end:
+                    return None
+                if start >= size:
+                    # 起点超出文件长度，无法满足
+                    continue
+                if end is None:
+                    end = size - 1
+            else:
+                # 后缀区间：最后 N 个字节
+                suffix = int(end)
+                if suffix == 0:
+                    continue
+                start, end = max(size - suffix, 0), size - 1
+        except ValueError:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size - 1)))
+
+    if len(ranges) > MAX_RANGES:
+        return None
+    return _coalesce(ranges)
+
+
+def _coalesce(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _if_range_matches(request, etag, last_modified):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        # If-Range 只能使用强校验
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _multipart_chunks(file, ranges, size, content_type, boundary):
+    try:
+        for start, end in ranges:
+            yield (
+                f'--{boundary}\r\n'
+                f'Content-Type: {content_type}\r\n'
+                f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'
+            ).encode()
+            part = FileRange(file, start, end - start + 1)
+            while True:
+                data = part.read(BLOCK_SIZE)
+                if not data:
+                    break
+                yield data
+            yield b'\r\n'
+        yield f'--{boundary}--\r\n'.encode()
+    finally:
+        file.close()
+
+
+def _multipart_length(ranges, size, content_type, boundary):
+    length = len(f'--{boundary}--\r\n')
+    for start, end in ranges:
+        length += len(
+            f'--{boundary}\r\n'
+            f'Content-Type: {content_type}\r\n'
+            f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'
+        )
+        length += end - start + 1 + 2
+    return length
+
+
+def _open(field_file):
+    """
+    优先直接打开本地文件（可用 sendfile），否则通过存储后端打开
+    """
+    try:
+        return open(field_file.path, 'rb')
+    except NotImplementedError:
+        return field_file.storage.open(field_file.name, 'rb')
+
+
+def serve_file(request, field_file):
+    """
+    以支持断点续传和条件请求的方式返回 FileField 中的文件
+    """
+    storage = field_file.storage
+    size = field_file.size
+    last_modified = int(storage.get_modified_time(field_file.name).timestamp())
+    etag = f'"{size:x}-{last_modified:x}"'
+    content_type = mimetypes.guess_type(field_file.name)[0] or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    ranges = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and _if_range_matches(request, etag, last_modified):
+        ranges = parse_range_header(range_header, size)
+
+    if ranges == []:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif not ranges:
+        response = FileResponse(_open(field_file), content_type=content_type)
+        response['Content-Length'] = size
+    elif len(ranges) == 1:
+        start, end = ranges[0]
+        response = FileResponse(
+            FileRange(_open(field_file), start, end - start + 1),
+            status=206,
+            content_type=content_type,
+        )
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        boundary = secrets.token_hex(16)
+        response = StreamingHttpResponse(
+            _multipart_chunks(_open(field_file), ranges, size, content_type, boundary),
+            status=206,
+            content_type=f'multipart/byteranges; boundary={boundary}',
+        )
+        response['Content-Length'] = _multipart_length(ranges, size, content_type, boundary)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
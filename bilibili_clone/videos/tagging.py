@@ -0,0 +1,83 @@
+"""
+标签名到ID的解析
+
+标签名映射缓存在 Django 缓存中；未命中的名称一次查询，仍不存在的标签
+批量创建（name 唯一，并发创建时忽略冲突）后再查询一次ID。
+标签改名或删除时清除对应的缓存。本地内存缓存收不到其他进程的删除，
+所以命中缓存的ID会用一次主键查询确认仍然存在，已失效的清除缓存后从数据库重新解析，
+否则写入标签关系时会违反外键约束。
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, pre_save
+from django.dispatch import receiver
+
+from .models import VideoTag
+
+NAME_MAX_LENGTH = VideoTag._meta.get_field('name').max_length
+
+
+def _cache_key(name):
+    # 标签名可能包含缓存键不允许的字符
+    return 'videotag:' + hashlib.md5(name.encode()).hexdigest()
+
+
+def normalize_tag_names(names):
+    """
+    去除空白、截断到字段长度并去重（保持顺序）
+    """
+    result = []
+    for name in names:
+        name = name.strip()[:NAME_MAX_LENGTH].strip()
+        if name and name not in result:
+            result.append(name)
+    return result
+
+
+def resolve_tags(names):
+    """
+    返回 {标签名: 标签ID}，不存在的标签会被创建
+    """
+    names = normalize_tag_names(names)
+    if not names:
+        return {}
+
+    keys = {_cache_key(name): name for name in names}
+    tag_ids = {keys[key]: tag_id for key, tag_id in cache.get_many(keys).items()}
+    if tag_ids:
+        alive = set(VideoTag.objects.filter(pk__in=tag_ids.values()).values_list('pk', flat=True))
+        stale = [name for name, tag_id in tag_ids.items() if tag_id not in alive]
+        if stale:
+            cache.delete_many([_cache_key(name) for name in stale])
+            for name in stale:
+                del tag_ids[name]
+
+    missing = [name for name in names if name not in tag_ids]
+    if missing:
+        found = dict(VideoTag.objects.filter(name__in=missing).values_list('name', 'id'))
+        to_create = [name for name in missing if name not in found]
+        if to_create:
+            VideoTag.objects.bulk_create([VideoTag(name=name) for name in to_create], ignore_conflicts=True)
+            found.update(VideoTag.objects.filter(name__in=to_create).values_list('name', 'id'))
+        tag_ids.update(found)
+        cache.set_many(
+            {_cache_key(name): tag_id for name, tag_id in found.items()},
+            getattr(settings, 'TAG_CACHE_TIMEOUT', 3600),
+        )
+    return tag_ids
+
+
+@receiver(pre_save, sender=VideoTag)
+def invalidate_renamed_tag(sender, instance, **kwargs):
+    if instance.pk is None:
+        return
+    old_name = VideoTag.objects.filter(pk=instance.pk).values_list('name', flat=True).first()
+    if old_name is not None and old_name != instance.name:
+        cache.delete(_cache_key(old_name))
+
+
+@receiver(post_delete, sender=VideoTag)
+def invalidate_deleted_tag(sender, instance, **kwargs):
+    cache.delete(_cache_key(instance.name))
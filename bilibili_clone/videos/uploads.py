@@ -0,0 +1,228 @@
+"""
+分块、可续传的视频上传
+
+1. 创建会话：在存储中预先创建最终文件（稀疏文件）
+2. 按偏移量 PUT 分块：请求体直接写入最终文件的对应位置，不经过临时文件
+3. 查询会话：返回已接收和缺失的区间，断线后只需补传缺失部分
+4. 完成上传：校验完整性后创建 Video，文件无需再复制一次
+
+校验和为整个文件的 CRC32。按顺序到达的分块在写入时增量计算，
+乱序到达的部分在完成上传时从磁盘补算。
+
+SQLite 会忽略 select_for_update，会话的并发修改都用条件 UPDATE 完成：
+分块只在会话仍处于上传状态且区间未被其他请求改动时记录，完成上传前
+先把状态从 uploading 改为 finalizing 认领会话，没有认领到的请求返回冲突。
+"""
+import os
+import re
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .media import enqueue_media_jobs
+from .models import UploadSession, Video
+
+BLOCK_SIZE = 64 * 1024
+
+# 预留文件名时遇到同名文件的重试次数
+RESERVE_ATTEMPTS = 10
+
+# 记录分块区间时与并发分块冲突的重试次数
+RECORD_ATTEMPTS = 10
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadError(Exception):
+    pass
+
+
+class UploadConflict(UploadError):
+    """
+    会话正在被其他请求完成或已经完成
+    """
+    pass
+
+
+def _storage():
+    return Video._meta.get_field('video_file').storage
+
+
+def create_session(owner, title, description, filename, total_size):
+    """
+    创建上传会话，并在存储中预留最终文件
+    """
+    max_size = getattr(settings, 'UPLOAD_MAX_SIZE', 4 * 1024 ** 3)
+    if total_size <= 0 or total_size > max_size:
+        raise UploadError('Invalid file size')
+
+    storage = _storage()
+    name = 'videos/' + get_valid_filename(os.path.basename(filename))
+    for _ in range(RESERVE_ATTEMPTS):
+        file_name = storage.get_available_name(name)
+        path = storage.path(file_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            with open(path, 'xb') as f:
+                f.truncate(total_size)
+            break
+        except FileExistsError:
+            # 并发的同名上传抢先创建了这个文件，换一个名字重试
+            continue
+    else:
+        raise UploadError('Could not reserve a file name')
+
+    return UploadSession.objects.create(
+        owner=owner,
+        title=title,
+        description=description,
+        file_name=file_name,
+        total_size=total_size,
+    )
+
+
+def parse_content_range(header, total_size):
+    """
+    解析 Content-Range: bytes start-end/total，返回 (start, end)（end 不含）
+    """
+    match = CONTENT_RANGE_RE.match(header or '')
+    if not match:
+        raise UploadError('Missing or invalid Content-Range')
+    start, last, total = (int(value) for value in match.groups())
+    if total != total_size or start > last or last >= total_size:
+        raise UploadError('Content-Range out of bounds')
+    return start, last + 1
+
+
+def write_chunk(session, stream, start, end):
+    """
+    把请求体流式写入文件的 [start, end) 区间，返回实际写入的字节数
+    """
+    if session.status != 'uploading':
+        raise UploadConflict('Upload already finalized')
+    offset = start
+    # 分块正好接在已校验前缀之后时，边写边计算校验和
+    checksum = session.checksum if start == session.checksum_offset else None
+    with open(_storage().path(session.file_name), 'r+b') as f:
+        f.seek(start)
+        while offset < end:
+            data = stream.read(min(BLOCK_SIZE, end - offset))
+            if not data:
+                break
+            f.write(data)
+            if checksum is not None:
+                checksum = zlib.crc32(data, checksum)
+            offset += len(data)
+
+    if offset == start:
+        return 0
+    for _ in range(RECORD_ATTEMPTS):
+        session = UploadSession.objects.get(pk=session.pk)
+        if session.status != 'uploading':
+            raise UploadConflict('Upload already finalized')
+        received_ranges, checksum_offset = session.received_ranges, session.checksum_offset
+        session.add_range(start, offset)
+        changes = {'received_ranges': session.received_ranges, 'updated_at': timezone.now()}
+        if checksum is not None and checksum_offset == start:
+            changes.update(checksum=checksum, checksum_offset=offset)
+        # 读取之后有其他分块记录了区间时重新读取合并
+        if UploadSession.objects.filter(
+            pk=session.pk, status='uploading', received_ranges=received_ranges, checksum_offset=checksum_offset,
+        ).update(**changes):
+            return offset - start
+    raise UploadConflict('Too many concurrent chunk writes')
+
+
+def compute_checksum(session):
+    """
+    从已校验前缀继续读取文件剩余部分，返回整个文件的CRC32
+    """
+    checksum = session.checksum
+    with open(_storage().path(session.file_name), 'rb') as f:
+        f.seek(session.checksum_offset)
+        while True:
+            data = f.read(BLOCK_SIZE)
+            if not data:
+                break
+            checksum = zlib.crc32(data, checksum)
+    return checksum
+
+
+def _claim(session):
+    """
+    把会话从 uploading 改为 finalizing，认领成功返回 True；
+    超过 UPLOAD_FINALIZE_TIMEOUT 仍未完成的认领视为崩溃遗留，可以重新认领
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=getattr(settings, 'UPLOAD_FINALIZE_TIMEOUT', 600))
+    return UploadSession.objects.filter(
+        Q(status='uploading') | Q(status='finalizing', updated_at__lt=stale),
+        pk=session.pk,
+        video__isnull=True,
+    ).update(status='finalizing', updated_at=now) == 1
+
+
+def _release(session):
+    UploadSession.objects.filter(pk=session.pk, status='finalizing').update(
+        status='uploading', updated_at=timezone.now()
+    )
+
+
+def finalize_session(session, expected_checksum=None, thumbnail=None, on_create=None):
+    """
+    校验文件完整性并创建 Video，文件保留在原位置，返回 (video, 是否新建)
+
+    on_create(video) 在创建视频的同一事务中调用（写入分类、标签等）。
+    先用条件 UPDATE 认领会话再计算校验和；已经完成的会话返回同一个 Video，
+    正在被其他请求完成时抛出 UploadConflict。
+    """
+    if session.video_id:
+        return session.video, False
+    if not session.is_complete:
+        raise UploadError('Upload is incomplete')
+    if not _claim(session):
+        session = UploadSession.objects.select_related('video').get(pk=session.pk)
+        if session.video_id:
+            return session.video, False
+        raise UploadConflict('Upload is being finalized')
+
+    try:
+        session.refresh_from_db()
+        if not session.is_complete:
+            raise UploadError('Upload is incomplete')
+        checksum = compute_checksum(session)
+        if expected_checksum is not None:
+            try:
+                expected_checksum = int(expected_checksum, 16)
+            except ValueError:
+                raise UploadError('Invalid checksum')
+            if expected_checksum != checksum:
+                raise UploadError('Checksum mismatch')
+
+        with transaction.atomic():
+            video = Video(
+                title=session.title,
+                description=session.description,
+                thumbnail=thumbnail,
+                uploader_id=session.owner_id,
+            )
+            # 直接指向已写好的文件，不再复制
+            video.video_file.name = session.file_name
+            video.save()
+            if on_create is not None:
+                on_create(video)
+            session.checksum = checksum
+            session.checksum_offset = session.total_size
+            session.video = video
+            session.status = 'complete'
+            session.save(update_fields=['checksum', 'checksum_offset', 'video', 'status', 'updated_at'])
+            enqueue_media_jobs(video)
+    except Exception:
+        _release(session)
+        raise
+    return video, True
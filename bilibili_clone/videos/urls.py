@@ -5,13 +5,21 @@ app_name = 'videos'
 
 urlpatterns = [
     path('', views.video_list, name='video_list'),
+    path('api/list/', views.video_list_api, name='video_list_api'),
+    path('feed/', views.following_feed, name='following_feed'),
+    path('api/feed/', views.following_feed_api, name='following_feed_api'),
     path('upload/', views.video_upload, name='video_upload'),
     path('upload-new/', views.upload_video, name='upload_video'),
+    path('upload/sessions/', views.create_upload_session, name='create_upload_session'),
+    path('upload/sessions/<uuid:session_id>/', views.upload_session, name='upload_session'),
+    path('upload/sessions/<uuid:session_id>/finalize/', views.finalize_upload, name='finalize_upload'),
     path('<int:pk>/', views.video_detail, name='video_detail'),
+    path('<int:pk>/stream/', views.stream_video, name='stream_video'),
     path('<int:pk>/like/', views.video_like, name='video_like'),
     path('<int:pk>/dislike/', views.video_dislike, name='video_dislike'),
     path('reaction/<int:video_id>/', views.toggle_video_reaction, name='toggle_video_reaction'),
     path('playlist/create/', views.create_playlist, name='create_playlist'),
     path('playlist/add/<int:video_id>/', views.add_video_to_playlist, name='add_video_to_playlist'),
     path('user/<str:username>/', views.user_videos, name='user_videos'),
+    path('api/user/<str:username>/', views.user_videos_api, name='user_videos_api'),
 ]
\ No newline at end of file
@@ -0,0 +1,105 @@
+"""
+视频观看记录缓冲
+
+video_detail 只把观看记录放入缓冲区，后台线程批量写入 VideoView，
+并对每个视频执行一次基于 F() 的 view_count 累加，对每个上传者累加 total_views。
+视频或用户在落库前已被删除的记录直接丢弃，不放回缓冲区重试。
+"""
+import logging
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F, Q
+
+from bilibili_clone.write_behind import WriteBehindBuffer, existing_ids
+from users.models import UserProfile
+from users.profile_cache import invalidate_profiles
+from .models import Video, VideoView
+
+logger = logging.getLogger(__name__)
+
+
+class VideoViewBuffer(WriteBehindBuffer):
+    name = 'video-view-buffer'
+
+    def record(self, video_id, user_id=None, ip_address=None):
+        """
+        记录一次观看：登录用户按用户去重，未登录用户按IP地址去重
+        """
+        if user_id is not None:
+            ip_address = None
+        key = (video_id, user_id, ip_address)
+        self.add(key, key)
+
+    def write(self, entries):
+        entries = self._exclude_missing(entries)
+        entries = self._exclude_recorded(entries)
+        if not entries:
+            return 0
+
+        increments = Counter(video_id for video_id, _, _ in entries)
+        with transaction.atomic():
+            VideoView.objects.bulk_create(
+                [VideoView(video_id=video_id, user_id=user_id, ip_address=ip_address)
+                 for video_id, user_id, ip_address in entries],
+                batch_size=500,
+            )
+            for video_id, count in increments.items():
+                Video.objects.filter(pk=video_id).update(view_count=F('view_count') + count)
+            uploader_increments = Counter()
+            for video_id, uploader_id in Video.objects.filter(pk__in=list(increments)).values_list('pk', 'uploader_id'):
+                uploader_increments[uploader_id] += increments[video_id]
+            for uploader_id, count in uploader_increments.items():
+                UserProfile.add_stats(uploader_id, total_views=count)
+            invalidate_profiles(uploader_increments)
+        return len(entries)
+
+    def _exclude_missing(self, entries):
+        """
+        丢弃视频或用户已被删除的记录，否则外键约束会让整批写入失败
+        """
+        video_ids = existing_ids(Video, {video_id for video_id, _, _ in entries})
+        user_ids = existing_ids(User, {user_id for _, user_id, _ in entries})
+        valid = [
+            entry for entry in entries
+            if entry[0] in video_ids and (entry[1] is None or entry[1] in user_ids)
+        ]
+        if len(valid) < len(entries):
+            logger.warning('%s dropped %d views of deleted videos or users', self.name, len(entries) - len(valid))
+        return valid
+
+    def _exclude_recorded(self, entries):
+        """
+        过滤掉数据库中已有的观看记录（每批最多两次查询）
+        """
+        video_ids = {video_id for video_id, _, _ in entries}
+        user_ids = {user_id for _, user_id, _ in entries if user_id is not None}
+        ip_addresses = {ip for _, user_id, ip in entries if user_id is None}
+
+        recorded = set()
+        if user_ids:
+            recorded.update(
+                (video_id, user_id, None)
+                for video_id, user_id in VideoView.objects.filter(
+                    video_id__in=video_ids, user_id__in=user_ids
+                ).values_list('video_id', 'user_id')
+            )
+        if ip_addresses:
+            ip_filter = Q(ip_address__in=[ip for ip in ip_addresses if ip is not None])
+            if None in ip_addresses:
+                ip_filter |= Q(ip_address__isnull=True)
+            recorded.update(
+                (video_id, None, ip_address)
+                for video_id, ip_address in VideoView.objects.filter(
+                    ip_filter, video_id__in=video_ids, user__isnull=True
+                ).values_list('video_id', 'ip_address')
+            )
+        return [entry for entry in entries if entry not in recorded]
+
+
+view_buffer = VideoViewBuffer(
+    flush_interval=getattr(settings, 'VIEW_BUFFER_FLUSH_INTERVAL', 5.0),
+    max_pending=getattr(settings, 'VIEW_BUFFER_MAX_PENDING', 1000),
+)
@@ -1,36 +1,104 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.http import JsonResponse
-from django.db.models import Q, Max
-from .models import Video, VideoCategory, VideoTag, VideoReaction, VideoView, Playlist, PlaylistItem
-from comments.models import Comment
-from users.models import Notification
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import require_http_methods, require_POST, require_safe
+from django.db import transaction
+from django.db.models import Max, Q
+from bilibili_clone.admission import admission_control
+from .feed import load_feed
+from .media import enqueue_media_jobs
+from .models import (
+    Video, VideoCategory, VideoCategoryRelation, VideoTagRelation, Playlist, PlaylistItem, UploadSession,
+)
+from .pagination import InvalidCursor, paginate
+from .related import get_related_videos, relations_changed
+from .search import search_videos
+from .streaming import serve_file
+from .tagging import resolve_tags
+from .uploads import UploadConflict, UploadError, create_session, finalize_session, parse_content_range, write_chunk
+from .view_buffer import view_buffer
+from comments.tree import COMMENT_ORDERINGS, load_comment_page
+from users.models import UserProfile
+from users.notifier import notifier
 
 
-def video_list(request):
+VIDEO_ORDERING = ('-upload_date', '-id')
+SEARCH_ORDERING = ('search_rank', 'id')
+
+
+def _page_size(request):
+    default = getattr(settings, 'VIDEO_PAGE_SIZE', 24)
+    try:
+        return max(1, min(int(request.GET.get('page_size', default)), 100))
+    except ValueError:
+        return default
+
+
+def _filter_videos(request):
     """
-    视频列表页面
+    根据 q/category 参数过滤已发布视频，返回 (查询集, 排序字段, 搜索词, 分类ID)
     """
-    videos = Video.objects.filter(published=True).select_related('uploader').prefetch_related('video_reactions')
-    categories = VideoCategory.objects.all()
+    videos = Video.objects.filter(published=True).select_related('uploader')
+    ordering = VIDEO_ORDERING
     
     # 获取搜索查询
     query = request.GET.get('q')
     if query:
-        videos = videos.filter(
-            Q(title__icontains=query) | 
-            Q(description__icontains=query) | 
-            Q(uploader__username__icontains=query)
-        )
+        matched = search_videos(videos, query)
+        if matched is not None:
+            # 全文索引命中，按相关度排序
+            videos = matched
+            ordering = SEARCH_ORDERING
+        else:
+            # 索引不可用时回退到ORM查询
+            videos = videos.filter(
+                Q(title__icontains=query) | 
+                Q(description__icontains=query) | 
+                Q(uploader__username__icontains=query)
+            )
     
     # 获取分类过滤
     category_id = request.GET.get('category')
     if category_id:
         videos = videos.filter(videocategoryrelation__category_id=category_id)
     
+    return videos, ordering, query, category_id
+
+
+def _video_card(video):
+    """
+    视频卡片的精简JSON表示
+    """
+    return {
+        'id': video.id,
+        'title': video.title,
+        'url': video.get_absolute_url(),
+        'thumbnail': video.card_thumbnail.url if video.card_thumbnail else None,
+        'uploader': video.uploader.username,
+        'upload_date': video.upload_date.isoformat(),
+        'view_count': video.view_count,
+        'like_count': video.like_count,
+        'comment_count': video.comment_count,
+    }
+
+
+def video_list(request):
+    """
+    视频列表页面
+    """
+    videos, ordering, query, category_id = _filter_videos(request)
+    try:
+        videos, next_cursor = paginate(videos, request.GET.get('cursor'), _page_size(request), ordering)
+    except InvalidCursor:
+        return HttpResponseBadRequest('Invalid cursor')
+    categories = VideoCategory.objects.all()
+    
     context = {
         'videos': videos,
+        'next_cursor': next_cursor,
         'categories': categories,
         'query': query,
         'selected_category': int(category_id) if category_id else None
@@ -38,51 +106,71 @@ def video_list(request):
     return render(request, 'videos/video_list.html', context)
 
 
+def video_list_api(request):
+    """
+    视频列表JSON接口（游标分页）
+    """
+    videos, ordering, query, category_id = _filter_videos(request)
+    try:
+        videos, next_cursor = paginate(videos, request.GET.get('cursor'), _page_size(request), ordering)
+    except InvalidCursor:
+        return JsonResponse({'success': False, 'message': 'Invalid cursor'}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'videos': [_video_card(video) for video in videos],
+        'next_cursor': next_cursor,
+    })
+
+
 def video_detail(request, pk):
     """
     视频详情页面
     """
-    video = get_object_or_404(Video, pk=pk, published=True)
+    video = get_object_or_404(Video.objects.select_related('uploader'), pk=pk, published=True)
     
-    # 增加观看次数
+    # 记录观看（写入缓冲区，由后台线程批量落库）
     if request.user.is_authenticated:
-        # 检查是否已经观看过
-        if not VideoView.objects.filter(video=video, user=request.user).exists():
-            VideoView.objects.create(video=video, user=request.user)
-            video.view_count += 1
-            video.save()
+        view_buffer.record(video.pk, user_id=request.user.pk)
     else:
         # 对于未登录用户，使用IP地址追踪
-        ip_address = request.META.get('REMOTE_ADDR')
-        if not VideoView.objects.filter(video=video, ip_address=ip_address).exists():
-            VideoView.objects.create(video=video, ip_address=ip_address)
-            video.view_count += 1
-            video.save()
+        view_buffer.record(video.pk, ip_address=request.META.get('REMOTE_ADDR'))
     
-    # 获取视频的评论
-    comments = Comment.objects.filter(video=video, parent=None, is_deleted=False).select_related('author')
+    # 获取首屏评论（一页顶层评论和每个楼层的前几条回复，其余通过接口加载）
+    comment_sort = request.GET.get('comment_sort', 'hot')
+    if comment_sort not in COMMENT_ORDERINGS:
+        comment_sort = 'hot'
+    comments, comments_cursor = load_comment_page(
+        video, comment_sort, page_size=getattr(settings, 'COMMENT_PAGE_SIZE', 20)
+    )
     
-    # 获取相关视频（基于分类的推荐）
-    related_videos = Video.objects.filter(
-        videocategoryrelation__category__in=video.videocategoryrelation_set.values('category')
-    ).exclude(pk=pk).distinct()[:6]
-    
-    # 如果基于分类的推荐不够，添加热门视频
-    if related_videos.count() < 6:
-        additional_videos = Video.objects.exclude(
-            pk=pk, 
-            pk__in=[v.pk for v in related_videos]
-        ).order_by('-view_count')[:6 - related_videos.count()]
-        related_videos = list(related_videos) + list(additional_videos)
+    # 获取相关视频（预先计算的相关视频索引）
+    related_videos = get_related_videos(video)
     
     context = {
         'video': video,
         'comments': comments,
+        'comments_cursor': comments_cursor,
+        'comment_sort': comment_sort,
         'related_videos': related_videos,
     }
     return render(request, 'videos/video_detail.html', context)
 
 
+@require_safe
+def stream_video(request, pk):
+    """
+    视频文件流式播放（支持Range和条件请求）
+    """
+    video = get_object_or_404(Video, pk=pk, published=True)
+    if not video.video_file:
+        raise Http404('Video file not found')
+    try:
+        return serve_file(request, video.video_file)
+    except FileNotFoundError:
+        raise Http404('Video file not found')
+
+
 @login_required
 def video_upload(request):
     """
@@ -91,6 +179,34 @@ def video_upload(request):
     return upload_video(request)
 
 
+def _attach_categories_and_tags(video, data):
+    """
+    根据表单中的 categories/tags 为视频添加分类和标签
+
+    查询次数与分类、标签数量无关：分类一次校验，标签批量解析，关系批量插入。
+    调用方应与创建视频放在同一个事务中，失败时不会留下没有标签的视频。
+    """
+    # 处理分类（忽略不存在的分类）
+    category_ids = [cat_id for cat_id in data.getlist('categories') if cat_id.isdigit()]
+    if category_ids:
+        category_ids = VideoCategory.objects.filter(pk__in=category_ids).values_list('pk', flat=True)
+    category_relations = [
+        VideoCategoryRelation(video=video, category_id=category_id) for category_id in category_ids
+    ]
+
+    # 处理标签
+    tag_ids = resolve_tags(data.get('tags', '').split(','))
+    tag_relations = [VideoTagRelation(video=video, tag_id=tag_id) for tag_id in tag_ids.values()]
+
+    if not category_relations and not tag_relations:
+        return
+    with transaction.atomic():
+        VideoCategoryRelation.objects.bulk_create(category_relations, ignore_conflicts=True)
+        VideoTagRelation.objects.bulk_create(tag_relations, ignore_conflicts=True)
+        # bulk_create 不触发信号，手动更新相关视频索引
+        transaction.on_commit(lambda: relations_changed(video.pk))
+
+
 @login_required
 def upload_video(request):
     """
@@ -103,32 +219,18 @@ def upload_video(request):
         thumbnail = request.FILES.get('thumbnail')
         
         if title and video_file:
-            video = Video.objects.create(
-                title=title,
-                description=description,
-                video_file=video_file,
-                thumbnail=thumbnail,
-                uploader=request.user
-            )
-            
-            # 处理分类
-            category_ids = request.POST.getlist('categories')
-            for cat_id in category_ids:
-                try:
-                    category = VideoCategory.objects.get(id=cat_id)
-                    video.videocategoryrelation_set.create(category=category)
-                except VideoCategory.DoesNotExist:
-                    pass
-            
-            # 处理标签
-            tags = request.POST.get('tags', '').split(',')
-            for tag_name in tags:
-                tag_name = tag_name.strip()
-                if tag_name:
-                    tag, created = VideoTag.objects.get_or_create(name=tag_name)
-                    video.videotagrelation_set.create(tag=tag)
+            with transaction.atomic():
+                video = Video.objects.create(
+                    title=title,
+                    description=description,
+                    video_file=video_file,
+                    thumbnail=thumbnail,
+                    uploader=request.user
+                )
+                _attach_categories_and_tags(video, request.POST)
+                enqueue_media_jobs(video)
             
-            return redirect('video_detail', pk=video.pk)
+            return redirect('videos:video_detail', pk=video.pk)
     
     categories = VideoCategory.objects.all()
     context = {
@@ -137,98 +239,151 @@ def upload_video(request):
     return render(request, 'videos/upload.html', context)
 
 
+def _upload_session_status(session):
+    return {
+        'success': True,
+        'session_id': str(session.id),
+        'total_size': session.total_size,
+        'received_size': session.received_size,
+        'received_ranges': session.received_ranges,
+        'missing_ranges': session.missing_ranges(),
+        'complete': session.is_complete,
+    }
+
+
 @login_required
+@require_POST
+def create_upload_session(request):
+    """
+    创建分块上传会话
+    """
+    title = request.POST.get('title')
+    filename = request.POST.get('filename')
+    try:
+        total_size = int(request.POST.get('size', ''))
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Invalid file size'}, status=400)
+    
+    if not title or not filename:
+        return JsonResponse({'success': False, 'message': 'Title and filename are required'}, status=400)
+    
+    try:
+        session = create_session(request.user, title, request.POST.get('description', ''), filename, total_size)
+    except UploadError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    
+    data = _upload_session_status(session)
+    data['chunk_size'] = getattr(settings, 'UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+    data['upload_url'] = reverse('videos:upload_session', kwargs={'session_id': session.id})
+    return JsonResponse(data, status=201)
+
+
+@login_required
+@require_http_methods(['GET', 'PUT'])
+def upload_session(request, session_id):
+    """
+    GET：查询已接收的区间；PUT：按 Content-Range 写入一个分块
+    """
+    session = get_object_or_404(UploadSession, id=session_id, owner=request.user)
+    
+    if request.method == 'PUT':
+        if session.status != 'uploading':
+            return JsonResponse({'success': False, 'message': 'Upload already finalized'}, status=409)
+        try:
+            start, end = parse_content_range(request.META.get('HTTP_CONTENT_RANGE'), session.total_size)
+        except UploadError as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
+        try:
+            write_chunk(session, request, start, end)
+        except UploadConflict as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=409)
+        session.refresh_from_db()
+    
+    return JsonResponse(_upload_session_status(session))
+
+
+@login_required
+@require_POST
+def finalize_upload(request, session_id):
+    """
+    完成分块上传，创建视频
+    """
+    session = get_object_or_404(UploadSession, id=session_id, owner=request.user)
+    try:
+        # 视频与分类、标签在同一个事务中写入
+        video, _ = finalize_session(
+            session,
+            expected_checksum=request.POST.get('checksum'),
+            thumbnail=request.FILES.get('thumbnail'),
+            on_create=lambda video: _attach_categories_and_tags(video, request.POST),
+        )
+    except UploadConflict as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=409)
+    except UploadError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'video_id': video.id,
+        'url': video.get_absolute_url(),
+    })
+
+
+@login_required
+@admission_control('reaction')
 def video_like(request, pk):
     """
     视频点赞（为URL兼容）
     """
     if request.method == 'POST':
         video = get_object_or_404(Video, id=pk)
+        previous, current = video.toggle_reaction(request.user, 'like')
         
-        # 检查是否存在已有反应
-        existing_reaction = VideoReaction.objects.filter(
-            video=video,
-            user=request.user
-        ).first()
-        
-        if existing_reaction:
-            if existing_reaction.reaction_type == 'like':
-                # 如果已经是点赞，则取消
-                existing_reaction.delete()
-            else:
-                # 如果是点踩，则改为点赞
-                existing_reaction.reaction_type = 'like'
-                existing_reaction.save()
-        else:
-            # 创建新的点赞
-            VideoReaction.objects.create(
-                video=video,
-                user=request.user,
-                reaction_type='like'
+        # 新的点赞，通知视频上传者（如果不是自己）
+        if previous is None and current == 'like' and video.uploader_id != request.user.id:
+            notifier.notify(
+                recipient_id=video.uploader_id,
+                sender_id=request.user.id,
+                notification_type='like',
+                title=f'{request.user.username} 点赞了你的视频',
+                message=f'{request.user.username} 点赞了你的视频 "{video.title}"',
+                target_url=f'{video.get_absolute_url()}',
+                aggregate_key=f'like:video:{video.id}',
+                verb='点赞了你的视频',
             )
-            
-            # 通知视频上传者（如果不是自己）
-            if video.uploader != request.user:
-                Notification.objects.create(
-                    recipient=video.uploader,
-                    sender=request.user,
-                    notification_type='like',
-                    title=f'{request.user.username} 点赞了你的视频',
-                    message=f'{request.user.username} 点赞了你的视频 "{video.title}"',
-                    target_url=f'{video.get_absolute_url()}'
-                )
         
         # 返回更新后的统计信息
         return JsonResponse({
             'success': True,
-            'likes': video.total_likes,
-            'dislikes': video.total_dislikes
+            'likes': video.like_count,
+            'dislikes': video.dislike_count
         })
     
     return JsonResponse({'success': False, 'message': 'Invalid request'})
 
 
 @login_required
+@admission_control('reaction')
 def video_dislike(request, pk):
     """
     视频点踩（为URL兼容）
     """
     if request.method == 'POST':
         video = get_object_or_404(Video, id=pk)
-        
-        # 检查是否存在已有反应
-        existing_reaction = VideoReaction.objects.filter(
-            video=video,
-            user=request.user
-        ).first()
-        
-        if existing_reaction:
-            if existing_reaction.reaction_type == 'dislike':
-                # 如果已经是点踩，则取消
-                existing_reaction.delete()
-            else:
-                # 如果是点赞，则改为点踩
-                existing_reaction.reaction_type = 'dislike'
-                existing_reaction.save()
-        else:
-            # 创建新的点踩
-            VideoReaction.objects.create(
-                video=video,
-                user=request.user,
-                reaction_type='dislike'
-            )
+        video.toggle_reaction(request.user, 'dislike')
         
         # 返回更新后的统计信息
         return JsonResponse({
             'success': True,
-            'likes': video.total_likes,
-            'dislikes': video.total_dislikes
+            'likes': video.like_count,
+            'dislikes': video.dislike_count
         })
     
     return JsonResponse({'success': False, 'message': 'Invalid request'})
 
 
 @login_required
+@admission_control('reaction')
 def toggle_video_reaction(request, video_id):
     """
     切换视频点赞/点踩
@@ -240,33 +395,13 @@ def toggle_video_reaction(request, video_id):
         if reaction_type not in ['like', 'dislike']:
             return JsonResponse({'success': False, 'message': 'Invalid reaction type'})
         
-        # 检查是否存在已有反应
-        existing_reaction = VideoReaction.objects.filter(
-            video=video,
-            user=request.user
-        ).first()
-        
-        if existing_reaction:
-            if existing_reaction.reaction_type == reaction_type:
-                # 如果是相同的反应类型，则删除
-                existing_reaction.delete()
-            else:
-                # 如果是不同的反应类型，则更新
-                existing_reaction.reaction_type = reaction_type
-                existing_reaction.save()
-        else:
-            # 创建新的反应
-            VideoReaction.objects.create(
-                video=video,
-                user=request.user,
-                reaction_type=reaction_type
-            )
+        video.toggle_reaction(request.user, reaction_type)
         
         # 返回更新后的统计信息
         return JsonResponse({
             'success': True,
-            'likes': video.total_likes,
-            'dislikes': video.total_dislikes
+            'likes': video.like_count,
+            'dislikes': video.dislike_count
         })
     
     return JsonResponse({'success': False, 'message': 'Invalid request'})
@@ -327,15 +462,75 @@ def add_video_to_playlist(request, video_id):
     return JsonResponse({'success': False, 'message': 'Invalid request'})
 
 
+@login_required
+def following_feed(request):
+    """
+    关注动态：关注的UP主发布的视频（游标分页）
+    """
+    try:
+        videos, next_cursor = load_feed(request.user, request.GET.get('cursor'), _page_size(request))
+    except InvalidCursor:
+        return HttpResponseBadRequest('Invalid cursor')
+    
+    context = {
+        'videos': videos,
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'videos/feed.html', context)
+
+
+@login_required
+def following_feed_api(request):
+    """
+    关注动态JSON接口（游标分页）
+    """
+    try:
+        videos, next_cursor = load_feed(request.user, request.GET.get('cursor'), _page_size(request))
+    except InvalidCursor:
+        return JsonResponse({'success': False, 'message': 'Invalid cursor'}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'videos': [_video_card(video) for video in videos],
+        'next_cursor': next_cursor,
+    })
+
+
 def user_videos(request, username):
     """
     用户上传的视频列表
     """
     user = get_object_or_404(User, username=username)
     videos = Video.objects.filter(uploader=user, published=True).select_related('uploader')
+    # 旧账号可能没有 UserProfile
+    video_count = UserProfile.objects.filter(user=user).values_list('total_videos', flat=True).first() or 0
+    try:
+        videos, next_cursor = paginate(videos, request.GET.get('cursor'), _page_size(request), VIDEO_ORDERING)
+    except InvalidCursor:
+        return HttpResponseBadRequest('Invalid cursor')
     
     context = {
         'profile_user': user,
         'videos': videos,
+        'video_count': video_count,
+        'next_cursor': next_cursor,
     }
-    return render(request, 'videos/user_videos.html', context)
\ No newline at end of file
+    return render(request, 'videos/user_videos.html', context)
+
+
+def user_videos_api(request, username):
+    """
+    用户上传视频的JSON接口（游标分页）
+    """
+    user = get_object_or_404(User, username=username)
+    videos = Video.objects.filter(uploader=user, published=True).select_related('uploader')
+    try:
+        videos, next_cursor = paginate(videos, request.GET.get('cursor'), _page_size(request), VIDEO_ORDERING)
+    except InvalidCursor:
+        return JsonResponse({'success': False, 'message': 'Invalid cursor'}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'videos': [_video_card(video) for video in videos],
+        'next_cursor': next_cursor,
+    })